@@ -1,17 +1,34 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, abort, send_from_directory
 import datetime
 import os
 import platform
 from pathlib import Path
-try:
-    import requests as _requests
-except Exception:
-    _requests = None
-    import urllib.request as _urllib
-    
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from models import init_db, SessionLocal, Lead, PageView, AccessLocation
+from models import init_db, SessionLocal, Lead, PageView, AccessLocation, DATA_DIR, fts_query
+import models
+import geoip
+import geocache
+import pagestats
+import mailer
+import ghstatus
+import deploy_events
+import filecache
+import logstream
+import pagecache
+import assets
+import compression
+import export
+import metrics
+import profiler
+import ratelimit
+import httpclient
+import mimetypes
+import logging
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import or_, text, update
+from sqlalchemy.orm import defer
+from mailer import send_contact_email_from_lead
 try:
     from flask_wtf import CSRFProtect
     from flask_wtf.csrf import generate_csrf
@@ -56,51 +73,118 @@ def _load_dotenv_if_present():
 
 # load .env early so subsequent os.environ.get(...) finds values
 _load_dotenv_if_present()
-# Rate limiter: use Redis if REDIS_URL is provided, otherwise fall back to in-memory
+# Rate limiter: use Redis if REDIS_URL is provided, otherwise counters shared by this pod's
+# workers in a memory-mapped file (ratelimit.py; RATELIMIT_STORAGE=memory for per-process)
 redis_url = os.environ.get('REDIS_URL') or os.environ.get('REDIS_URI')
+# RATELIMIT_ENABLED=0 switches all limits off (load tests)
+app.config.setdefault('RATELIMIT_ENABLED', os.environ.get('RATELIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no'))
 if redis_url:
     app.logger.info(f'Configuring rate limiter to use Redis at {redis_url}')
     limiter = Limiter(key_func=get_remote_address, app=app, default_limits=["200 per day", "50 per hour"], storage_uri=redis_url)
 else:
-    limiter = Limiter(key_func=get_remote_address, app=app, default_limits=["200 per day", "50 per hour"])
+    limiter = Limiter(key_func=get_remote_address, app=app, default_limits=["200 per day", "50 per hour"],
+                      storage_uri=ratelimit.from_env())
+
+# Prometheus metrics (request latency, in-flight, SQL, templates, outbound calls); served at /metrics
+metrics.init_app(app)
+metrics.instrument_engine(models.engine)
 
 # CSRF protection for POST endpoints (adds protection against cross-site POST requests)
 csrf = CSRFProtect()
 csrf.init_app(app)
 
-# initialize DB (creates data dir and sqlite file)
-init_db()
-import logging
-from logging.handlers import RotatingFileHandler
-import smtplib
-from email.message import EmailMessage
-
-# Ensure log directory exists and configure file handler
-LOG_DIR = os.path.join(os.path.dirname(__file__), 'log')
-os.makedirs(LOG_DIR, exist_ok=True)
+# IP -> country answers: in-process LRU backed by the ip_geo_cache table
+geo_cache = geocache.from_env()
+# page view / access location counters, flushed in batches (write-behind)
+page_stats_buffer = pagestats.from_env()
+# contact email outbox (background SMTP delivery)
+outbox = mailer.from_env()
+# GitHub Actions status shared by all workers (file cache under data/)
+github_status_cache = ghstatus.from_env()
+# one poller per worker pushing run changes to /api/github-actions/stream clients
+runs_watcher = deploy_events.from_env(github_status_cache.get)
+# log/app.log (LOG_DIR overrides); the file handler is attached in setup_app()
+LOG_DIR = os.environ.get('LOG_DIR') or os.path.join(os.path.dirname(__file__), 'log')
 log_path = os.path.join(LOG_DIR, 'app.log')
 
-file_handler = RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024, backupCount=5)
-formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
-file_handler.setFormatter(formatter)
-file_handler.setLevel(logging.INFO)
+# /deploy page: cached build artifacts and incremental tail of app.log
+artifact_cache = filecache.FileCache(max_chars=20000)
+app_log_tail = filecache.LogTail(log_path, n=200)
+log_follower = logstream.from_env(log_path)
+
+# opt-in request profiling into log/profiles (PROFILING=1), registered by setup_app()
+request_profiler = None
+
+
+def _page_cache_key():
+    try:
+        is_admin = bool(session.get('admin'))
+    except Exception:
+        is_admin = False
+    return select_language(), is_admin
+
+
+# rendered /, /about and /articles per (endpoint, lang, is_admin), with ETag/304
+page_cache = pagecache.from_env(_page_cache_key, os.path.join(os.path.dirname(__file__), 'templates'))
+
+# host facts shown in page footers; they don't change while the process runs
+SYSTEM_INFO = {
+    "os": platform.system(),
+    "release": platform.release(),
+    "containerized": os.path.exists('/.dockerenv'),
+}
+
+
+# fingerprinted static URLs (templates call asset_url('js/deploy.js')) and their
+# gzip/brotli variants; both are built once by setup_app()
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+asset_manifest = None
+static_precompressed = compression.StaticPrecompressed()
+
+# dynamic HTML/JSON compression
+response_compressor = compression.from_env()
+
+
+@app.after_request
+def compress_response(response):
+    try:
+        return response_compressor(response, request)
+    except Exception:
+        app.logger.exception('Response compression failed')
+        return response
+
+
+def system_info():
+    data = dict(SYSTEM_INFO, status="Healthy")
+    data["deploy_time"] = datetime.datetime.utcnow().isoformat()
+    return data
 
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
-app.logger.info(f"Logging initialized. Log file: {log_path}")
+
+@app.route('/static/a/<path:filename>')
+@limiter.exempt
+def hashed_static(filename):
+    """Serve a content-hashed static file with long-lived immutable caching."""
+    resolved = asset_manifest.resolve(filename)
+    if resolved is None:
+        abort(404)
+    directory, name, cache_control = resolved
+    encoding, body = static_precompressed.pick(filename, request.accept_encodings)
+    if body is not None:
+        resp = Response(body, mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        resp.headers['Content-Encoding'] = encoding
+    else:
+        resp = send_from_directory(directory, name)
+    if static_precompressed.has(filename):
+        resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = cache_control
+    return resp
 
 
 @app.route('/')
+@page_cache.cached
 def home():
-    data = {
-        "os": platform.system(),
-        "release": platform.release(),
-        "status": "Healthy",
-        "containerized": os.path.exists('/.dockerenv')
-    }
-    # include deploy_time so footer shows the same info as other pages
-    data["deploy_time"] = datetime.datetime.utcnow().isoformat()
-    return render_template('index.html', info=data)
+    # includes deploy_time so footer shows the same info as other pages
+    return render_template('index.html', info=system_info())
 
 
 def get_client_ip():
@@ -114,25 +198,17 @@ def get_client_ip():
 
 
 def get_country_for_ip(ip: str) -> str:
-    """Return ISO country code for given IP using ipapi.co. Returns empty string on failure."""
+    """Return ISO country code for given IP. Returns empty string on failure.
+    Uses the offline range database (geoip.py); ipapi.co only when GEOIP_PROVIDER=ipapi,
+    GEOIP_IPAPI_FALLBACK=1 or no database has been built. Answers (including failures) are cached in geo_cache.
+    """
     if not ip or ip.startswith('127.') or ip == '::1':
         return ''
     try:
-        if _requests is not None:
-            resp = _requests.get(f'https://ipapi.co/{ip}/country/', timeout=1.5)
-            if resp.status_code == 200:
-                return resp.text.strip()
-        else:
-            # urllib fallback
-            try:
-                with _urllib.urlopen(f'https://ipapi.co/{ip}/country/', timeout=1.5) as r:
-                    data = r.read().decode('utf-8', errors='ignore')
-                    return data.strip()
-            except Exception:
-                pass
+        with metrics.track('geoip'):
+            return geo_cache.get_or_resolve(ip, geoip.country_for_ip, persist=geoip.resolves_remotely())
     except Exception:
-        pass
-    return ''
+        return ''
 
 
 def select_language():
@@ -227,7 +303,10 @@ translations = {
         'top_pages_sub': 'Poslední záznamy',
         'location_title': 'Lokality přístupů',
         'location_sub': 'Počet návštěv podle zemí',
-        'shown_records_info': 'Zobrazeno až 200 posledních záznamů',
+        'unique_visitors': 'Unikátní návštěvníci',
+        'visitors_today': 'dnes',
+        'visitors_week': '7 dní',
+        'shown_records_info': 'Nejnovější záznamy, po 50 na stránku',
         'search_placeholder': 'Hledat podle jména nebo e-mailu',
         'lead_id': '#',
         'lead_name': 'Jméno',
@@ -261,7 +340,23 @@ translations = {
         'recent_logs': 'Poslední logy aplikace',
         'artifact_files': 'Soubory použití k sestavení',
         'show_content': 'Zobrazit obsah',
-        'security': 'Bezpečnost'
+        'security': 'Bezpečnost',
+        'resend_selected': 'Znovu odeslat vybrané',
+        'resend_failed': 'Znovu odeslat všechny neúspěšné',
+        'bulk_results_title': 'Výsledek hromadného odeslání',
+        'older_leads': 'Starší',
+        'newest_leads': 'Nejnovější',
+        'show_message': 'Zobrazit zprávu',
+        'follow_logs': 'Sledovat živě',
+        'profiles_title': 'Profily requestů',
+        'profiles_desc': 'Profil vznikne pro request s hlavičkou X-Profile: 1 nebo ?__profile=1 (jen admin), případně vzorkováním.',
+        'profiles_disabled': 'Profilování je vypnuté. Zapněte ho proměnnou PROFILING=1.',
+        'profiles_empty': 'Zatím žádné profily.',
+        'profile_created': 'Zaznamenáno',
+        'profile_route': 'Request',
+        'profile_duration': 'Doba (ms)',
+        'profile_trigger': 'Spuštěno',
+        'profile_files': 'Soubory'
     },
     'en': {
         'home': 'Home',
@@ -315,7 +410,10 @@ translations = {
         'top_pages_sub': 'Recent records',
         'location_title': 'Access locations',
         'location_sub': 'Visit counts per country',
-        'shown_records_info': 'Showing up to 200 recent records',
+        'unique_visitors': 'Unique visitors',
+        'visitors_today': 'today',
+        'visitors_week': '7 days',
+        'shown_records_info': 'Newest records, 50 per page',
         'search_placeholder': 'Search by name or email',
         'lead_id': '#',
         'lead_name': 'Name',
@@ -349,7 +447,23 @@ translations = {
         'recent_logs': 'Recent application logs',
         'artifact_files': 'Build artifact files',
         'show_content': 'Show content',
-        'security': 'Security'
+        'security': 'Security',
+        'resend_selected': 'Resend selected',
+        'resend_failed': 'Resend all failed',
+        'bulk_results_title': 'Bulk resend results',
+        'older_leads': 'Older',
+        'newest_leads': 'Newest',
+        'show_message': 'Show message',
+        'follow_logs': 'Follow live',
+        'profiles_title': 'Request profiles',
+        'profiles_desc': 'A profile is recorded for requests sent with X-Profile: 1 or ?__profile=1 (admin only), or picked by sampling.',
+        'profiles_disabled': 'Profiling is disabled. Enable it with PROFILING=1.',
+        'profiles_empty': 'No profiles yet.',
+        'profile_created': 'Recorded',
+        'profile_route': 'Request',
+        'profile_duration': 'Duration (ms)',
+        'profile_trigger': 'Trigger',
+        'profile_files': 'Files'
     }
 }
 
@@ -386,10 +500,19 @@ def inject_translations():
     return dict(tr=tr, current_lang=lang, current_path=current_path, admin_enabled=admin_enabled, is_admin=is_admin)
 
 
+@app.before_request
+def start_outbox():
+    """Start the outbox delivery thread in this worker (first request after fork)."""
+    if os.environ.get('OUTBOX_MODE', 'thread').lower() == 'thread':
+        outbox.ensure_started()
+
+
 @app.before_request
 def track_page_view():
-    """Record page view only for the main page ('/') and update access location counts."""
-    s = None
+    """Record page view only for the main page ('/') and update access location counts.
+    Hits are buffered per worker (pagestats.CounterBuffer) and flushed in batches;
+    client IP + User-Agent feed the per-day unique-visitor sketch.
+    """
     try:
         # Only count safe GETs
         if request.method != 'GET':
@@ -399,19 +522,9 @@ def track_page_view():
         if p != '/':
             return
 
-        s = SessionLocal()
-        now = datetime.datetime.utcnow()
-
-        # Update page view for root path
-        pv = s.query(PageView).filter_by(path='/').first()
-        if not pv:
-            pv = PageView(path='/', count=1, first_seen=now, last_seen=now)
-            s.add(pv)
-        else:
-            pv.count = (pv.count or 0) + 1
-            pv.last_seen = now
-
-        # Update access location (country) stats
+        # Resolve access location (country)
+        country = None
+        ip = None
         try:
             ip = get_client_ip()
             country = get_country_for_ip(ip)
@@ -422,59 +535,29 @@ def track_page_view():
                     country = 'CZ'
                 else:
                     country = 'OTHER'
-
-            al = s.query(AccessLocation).filter_by(country=country).first()
-            if not al:
-                al = AccessLocation(country=country, count=1, first_seen=now, last_seen=now)
-                s.add(al)
-            else:
-                al.count = (al.count or 0) + 1
-                al.last_seen = now
         except Exception:
             # don't let geo lookup failures stop counting page views
-            pass
+            country = None
 
-        s.commit()
+        visitor = f"{ip}|{request.headers.get('User-Agent', '')}" if ip else None
+        page_stats_buffer.record('/', country, visitor=visitor)
     except Exception:
         try:
             app.logger.exception('Failed to record page view')
         except Exception:
             pass
-        try:
-            if s:
-                s.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if s:
-                s.close()
-        except Exception:
-            pass
 
 
 @app.route('/about')
+@page_cache.cached
 def about():
-    data = {
-        "os": platform.system(),
-        "release": platform.release(),
-        "status": "Healthy",
-        "containerized": os.path.exists('/.dockerenv'),
-        "deploy_time": datetime.datetime.utcnow().isoformat()
-    }
-    return render_template('about.html', info=data)
+    return render_template('about.html', info=system_info())
 
 
 @app.route('/articles')
+@page_cache.cached
 def articles():
-    data = {
-        "os": platform.system(),
-        "release": platform.release(),
-        "status": "Healthy",
-        "containerized": os.path.exists('/.dockerenv'),
-        "deploy_time": datetime.datetime.utcnow().isoformat()
-    }
-    return render_template('articles.html', info=data)
+    return render_template('articles.html', info=system_info())
 
 
 @app.route('/deploy')
@@ -484,139 +567,64 @@ def deploy_demo():
     shows the tail of the application log. This is read-only and does not
     execute any build commands on the server — it's only a visual demo.
     """
-    data = {
-        "os": platform.system(),
-        "release": platform.release(),
-        "status": "Healthy",
-        "containerized": os.path.exists('/.dockerenv'),
-        "deploy_time": datetime.datetime.utcnow().isoformat()
-    }
+    data = system_info()
 
     base = os.path.dirname(__file__)
 
-    def read_file_safe(path, max_chars=20000):
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                if len(content) > max_chars:
-                    return content[:max_chars] + '\n\n...content truncated...'
-                return content
-        except Exception:
-            return ''
-
+    # artifacts are only re-read when (inode, size, mtime) changes
     artifacts = {}
     for fname in ('Dockerfile', 'docker-compose.yml', 'README_DOCKER.md', 'requirements.txt'):
-        fp = os.path.join(base, fname)
-        artifacts[fname] = {
-            'exists': os.path.exists(fp),
-            'mtime': datetime.datetime.fromtimestamp(os.path.getmtime(fp)).isoformat() if os.path.exists(fp) else '',
-            'content': read_file_safe(fp)
-        }
+        artifacts[fname] = artifact_cache.get(os.path.join(base, fname))
 
-    # tail app log (last N lines) efficiently
-    log_fp = os.path.join(LOG_DIR, 'app.log')
-    def tail(fpath, n=200):
-        try:
-            with open(fpath, 'rb') as f:
-                f.seek(0, 2)
-                end = f.tell()
-                block_size = 1024
-                data = b''
-                while end > 0 and data.count(b'\n') <= n:
-                    start = max(0, end - block_size)
-                    f.seek(start)
-                    data = f.read(end - start) + data
-                    end = start
-                    block_size *= 2
-                lines = data.splitlines()[-n:]
-                return '\n'.join([ln.decode('utf-8', errors='replace') for ln in lines])
-        except Exception:
-            return ''
+    # tail app log (last N lines); only bytes appended since the previous view are read
+    logs_tail = app_log_tail.read()
 
-    logs_tail = tail(log_fp, 200)
+    return render_template('deploy.html', info=data, artifacts=artifacts, logs=logs_tail,
+                           log_cursor=log_follower.current_cursor() or '')
 
-    return render_template('deploy.html', info=data, artifacts=artifacts, logs=logs_tail)
+
+@app.route('/api/logs/stream')
+@limiter.exempt
+def logs_stream():
+    """Server-Sent Events with lines appended to app.log after ``cursor`` (inode:offset).
+    Optional filters: ``level`` (minimum level) and ``q`` (substring). Public like /deploy,
+    so it starts no earlier than the /deploy tail window and is byte-capped per client.
+    """
+    if not deploy_events.streaming_supported(request.environ):
+        return jsonify({'success': False, 'error': 'streaming not available'}), 503
+    cursor = logstream.parse_cursor(request.headers.get('Last-Event-ID') or request.args.get('cursor'))
+    level = request.args.get('level')
+    q = (request.args.get('q') or '')[:200]
+    client = get_remote_address()
+    if log_follower.budgets.remaining(client) <= 0:
+        return jsonify({'success': False, 'error': 'log stream byte budget used up, try again later'}), 429
+    if not log_follower.clients.acquire():
+        return jsonify({'success': False, 'error': 'too many log followers'}), 503
+
+    def generate():
+        try:
+            yield from log_follower.follow(cursor=cursor, level=level, q=q, client=client)
+        finally:
+            log_follower.clients.release()
+
+    resp = Response(generate(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
 
 @app.route('/api/github-actions/status')
+@limiter.exempt
 def github_actions_status():
-    """API endpoint that fetches real GitHub Actions workflow runs status."""
+    """API endpoint with GitHub Actions workflow runs status.
+    Served from the shared ghstatus cache (TTL + ETag revalidation, single upstream fetch).
+    """
     try:
-        # GitHub API settings
-        repo_owner = "nw4f2t4gqz-commits"
-        repo_name = "devops-web"
-        workflow_name = "docker-publish.yml"
-        
-        # GitHub API URL
-        api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/workflows/{workflow_name}/runs"
-        
-        # Headers (no token needed for public repos, but recommended for rate limits)
-        headers = {
-            "Accept": "application/vnd.github.v3+json",
-            "User-Agent": "DevOps-Web-App"
-        }
-        
-        # Optional: Add GitHub token if available (for higher rate limits)
-        github_token = os.environ.get('GITHUB_TOKEN') or os.environ.get('GHCR_PAT')
-        if github_token:
-            headers["Authorization"] = f"Bearer {github_token}"
-        
-        # Fetch workflow runs (last 5)
-        if _requests:
-            response = _requests.get(api_url, headers=headers, params={"per_page": 5}, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                runs = []
-                for run in data.get('workflow_runs', []):
-                    runs.append({
-                        'id': run['id'],
-                        'name': run['name'],
-                        'status': run['status'],  # queued, in_progress, completed
-                        'conclusion': run['conclusion'],  # success, failure, cancelled, skipped
-                        'created_at': run['created_at'],
-                        'updated_at': run['updated_at'],
-                        'html_url': run['html_url'],
-                        'head_commit': {
-                            'message': run['head_commit']['message'],
-                            'author': run['head_commit']['author']['name']
-                        } if run.get('head_commit') else None
-                    })
-                return jsonify({
-                    'success': True,
-                    'runs': runs,
-                    'total_count': data.get('total_count', 0)
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': f'GitHub API returned status {response.status_code}'
-                }), 500
-        else:
-            # Fallback using urllib
-            req = _urllib.Request(api_url + "?per_page=5", headers=headers)
-            with _urllib.urlopen(req, timeout=5) as response:
-                import json
-                data = json.loads(response.read().decode())
-                runs = []
-                for run in data.get('workflow_runs', []):
-                    runs.append({
-                        'id': run['id'],
-                        'name': run['name'],
-                        'status': run['status'],
-                        'conclusion': run['conclusion'],
-                        'created_at': run['created_at'],
-                        'updated_at': run['updated_at'],
-                        'html_url': run['html_url'],
-                        'head_commit': {
-                            'message': run['head_commit']['message'],
-                            'author': run['head_commit']['author']['name']
-                        } if run.get('head_commit') else None
-                    })
-                return jsonify({
-                    'success': True,
-                    'runs': runs,
-                    'total_count': data.get('total_count', 0)
-                })
+        payload, status, cache_state = github_status_cache.get()
+        resp = jsonify(payload)
+        resp.status_code = status
+        resp.headers['X-Cache'] = cache_state
+        return resp
     except Exception as e:
         return jsonify({
             'success': False,
@@ -624,6 +632,23 @@ def github_actions_status():
         }), 500
 
 
+@app.route('/api/github-actions/stream')
+@limiter.exempt
+def github_actions_stream():
+    """Server-Sent Events: full snapshot of workflow runs, then only diffs as they change."""
+    if not deploy_events.streaming_supported(request.environ):
+        # sync worker: a stream would block it; deploy.js falls back to polling
+        return jsonify({'success': False, 'error': 'streaming not available'}), 503
+    q, snapshot = runs_watcher.subscribe()
+    if q is None:
+        return jsonify({'success': False, 'error': 'too many stream clients'}), 503
+    resp = Response(runs_watcher.stream(q, snapshot, max_seconds=deploy_events.max_stream_seconds()),
+                    mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
 @app.route('/contact', methods=['GET', 'POST'])
 @limiter.limit("10 per hour")
 def contact():
@@ -649,87 +674,70 @@ def contact():
     if '@' not in email or ' ' in email:
         return render_template('contact.html', success=False, error='Zadejte platný email.')
 
-    # For now, just log the lead. In production replace with SMTP/SendGrid or similar.
     app.logger.info(f"Contact form submitted: name={name} email={email} from={get_client_ip()} message_len={len(message)}")
 
-    # Persist lead to database
+    # Persist lead and queue it in the outbox; delivery happens in the background (mailer.OutboxWorker)
     db_session = None
+    lead = None
     try:
         db_session = SessionLocal()
-        lead = Lead(name=name, email=email, message=message, ip=get_client_ip())
+        lead = Lead(name=name, email=email, message=message, ip=get_client_ip(),
+                    attempts=0, next_attempt_at=datetime.datetime.utcnow())
         db_session.add(lead)
         db_session.commit()
-        db_session.refresh(lead)
         app.logger.info(f"Lead persisted id={lead.id}")
     except Exception:
         app.logger.exception('Failed to persist lead to DB')
+        lead = None
         if db_session:
             try:
                 db_session.rollback()
             except Exception:
                 pass
+    finally:
+        if db_session:
+            db_session.close()
 
-    # Try to send email if SMTP is configured (Office365 or other SMTP)
-    smtp_host = os.environ.get('SMTP_HOST')
-    smtp_port = int(os.environ.get('SMTP_PORT', 587))
-    smtp_user = os.environ.get('SMTP_USER')
-    smtp_pass = os.environ.get('SMTP_PASS')
-    email_to = os.environ.get('EMAIL_TO')
-
-    if not (smtp_host and smtp_user and smtp_pass and email_to):
+    if not mailer.smtp_settings():
         app.logger.warning('SMTP not configured; contact not emailed. Set SMTP_HOST/SMTP_USER/SMTP_PASS/EMAIL_TO')
         return render_template('contact.html', success=False, error='Email není nakonfigurován. Kontakt byl zaznamenán.')
 
+    if lead is not None:
+        outbox.notify()
+        return render_template('contact.html', success=True, error=None)
+
+    # DB unavailable: nothing to queue, so deliver inline as a last resort
     try:
-        msg = EmailMessage()
-        msg['Subject'] = f'Kontakt z webu: {name}'
-        msg['From'] = smtp_user
-        msg['To'] = email_to
-        msg['Reply-To'] = email
-        body = f"Jméno: {name}\nEmail: {email}\nIP: {get_client_ip()}\n\n{message}"
-        msg.set_content(body)
-
-        with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as s:
-            s.starttls()
-            s.login(smtp_user, smtp_pass)
-            s.send_message(msg)
-
-        app.logger.info(f'Contact email sent to {email_to} for lead {email}')
-        # mark lead emailed
-        try:
-            if db_session is None:
-                db_session = SessionLocal()
-            if 'lead' in locals():
-                lead.emailed = True
-                lead.emailed_at = datetime.datetime.utcnow()
-                db_session.add(lead)
-                db_session.commit()
-        except Exception:
-            app.logger.exception('Failed to update lead emailed status')
+        send_contact_email_from_lead(Lead(name=name, email=email, message=message, ip=get_client_ip()))
+        app.logger.info(f'Contact email sent inline for {email} (lead not persisted)')
         return render_template('contact.html', success=True, error=None)
     except Exception as e:
         app.logger.exception(f'Failed to send contact email: {e}')
-        # record error on lead
-        try:
-            if db_session is None:
-                db_session = SessionLocal()
-            if 'lead' in locals():
-                lead.error = str(e)
-                db_session.add(lead)
-                db_session.commit()
-        except Exception:
-            app.logger.exception('Failed to record lead error status')
         return render_template('contact.html', success=False, error='Nepodařilo se odeslat email. Zkuste to prosím později.')
 
 
+@app.route('/metrics')
+@limiter.exempt
+def prometheus_metrics():
+    """Prometheus scrape endpoint (aggregated over all gunicorn workers in multi-process mode)."""
+    if not metrics.ENABLED:
+        abort(404)
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization', '') != f'Bearer {token}':
+        abort(401)
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type, headers={'Cache-Control': 'no-store'})
+
+
 @app.route('/health')
+@limiter.exempt
 def health():
     """Simple health endpoint for probes/monitoring."""
     try:
         resp = {
             "status": "ok",
             "time": datetime.datetime.utcnow().isoformat(),
-            "containerized": os.path.exists('/.dockerenv')
+            "containerized": SYSTEM_INFO["containerized"]
         }
         return jsonify(resp), 200
     except Exception:
@@ -737,10 +745,8 @@ def health():
 
 import os
 import base64
-import smtplib
 import datetime
 from functools import wraps
-from email.message import EmailMessage
 from flask import render_template, request, redirect, url_for, Response, abort
 
 from models import SessionLocal, Lead, PageView, AccessLocation
@@ -780,30 +786,6 @@ def admin_required(f):
         return redirect(url_for('admin_login', next=request.path))
     return wrapper
 
-def send_contact_email_from_lead(lead: Lead):
-    """Pošle email pro záznam Lead; vyhazuje výjimku při selhání."""
-    SMTP_HOST = os.environ.get('SMTP_HOST')
-    SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
-    SMTP_USER = os.environ.get('SMTP_USER')
-    SMTP_PASS = os.environ.get('SMTP_PASS')
-    EMAIL_TO = os.environ.get('EMAIL_TO')
-    if not (SMTP_HOST and SMTP_USER and SMTP_PASS and EMAIL_TO):
-        raise RuntimeError("SMTP not configured")
-
-    msg = EmailMessage()
-    msg['Subject'] = f'Kontakt z webu: {lead.name}'
-    msg['From'] = SMTP_USER
-    msg['To'] = EMAIL_TO
-    body = f"Jméno: {lead.name}\nEmail: {lead.email}\nIP: {lead.ip}\n\n{lead.message}"
-    msg.set_content(body)
-
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as s:
-        s.set_debuglevel(0)
-        s.starttls()
-        s.login(SMTP_USER, SMTP_PASS)
-        s.send_message(msg)
-
-
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     """Simple session-based admin login. Falls back to Basic auth for API clients."""
@@ -834,51 +816,312 @@ def admin_logout():
 @app.route('/admin/leads')
 @admin_required
 def admin_leads():
+    return _render_admin_leads()
+
+
+LEADS_PAGE_SIZE = 50
+
+
+def _leads_page(s, q=None, before=None, limit=LEADS_PAGE_SIZE):
+    """One page of leads, newest first, keyed on id (?before=<id>) instead of OFFSET.
+
+    The message body is deferred; the list only needs the short columns and the
+    body is fetched on expand (/admin/leads/<id>/message). Returns (leads, next_before).
+    """
+    query = s.query(Lead).options(defer(Lead.message))
+    if q:
+        if models.LEADS_FTS and fts_query(q):
+            query = query.filter(text('leads.id IN (SELECT rowid FROM leads_fts WHERE leads_fts MATCH :fts)')
+                                 .bindparams(fts=fts_query(q)))
+        else:
+            like = f'%{q}%'
+            query = query.filter(or_(Lead.name.like(like), Lead.email.like(like)))
+    if before:
+        query = query.filter(Lead.id < before)
+    leads = query.order_by(Lead.id.desc()).limit(limit + 1).all()
+    next_before = leads[limit - 1].id if len(leads) > limit else None
+    return leads[:limit], next_before
+
+
+def _render_admin_leads(bulk_results=None):
+    # make this worker's buffered hits visible before reading the counters
+    page_stats_buffer.flush_quietly()
+    q = (request.args.get('q') or '').strip()[:200]
+    before = request.args.get('before', type=int)
     s = SessionLocal()
-    leads = s.query(Lead).order_by(Lead.id.desc()).limit(200).all()
     try:
-        page_stats = s.query(PageView).order_by(PageView.count.desc()).limit(50).all()
-    except Exception:
-        page_stats = []
+        try:
+            leads, next_before = _leads_page(s, q=q, before=before)
+        except Exception:
+            app.logger.exception('Lead search failed')
+            leads, next_before = [], None
+        try:
+            page_stats = s.query(PageView).order_by(PageView.count.desc()).limit(50).all()
+        except Exception:
+            page_stats = []
+        try:
+            visitor_stats = pagestats.unique_visitors(s, [p.path for p in page_stats])
+        except Exception:
+            app.logger.exception('Unique visitor estimate failed')
+            visitor_stats = {}
+        try:
+            location_stats = s.query(AccessLocation).order_by(AccessLocation.count.desc()).limit(50).all()
+        except Exception:
+            location_stats = []
+        return render_template('admin_leads.html', leads=leads, page_stats=page_stats, location_stats=location_stats,
+                               visitor_stats=visitor_stats, bulk_results=bulk_results, q=q, before=before, next_before=next_before)
+    finally:
+        # return the connection to the pool now rather than whenever the session is garbage collected
+        s.close()
+
+
+@app.route('/admin/leads/<int:lead_id>/message')
+@admin_required
+def admin_lead_message(lead_id):
+    """Message body of one lead (deferred in the list view)."""
+    s = SessionLocal()
     try:
-        location_stats = s.query(AccessLocation).order_by(AccessLocation.count.desc()).limit(50).all()
-    except Exception:
-        location_stats = []
-    return render_template('admin_leads.html', leads=leads, page_stats=page_stats, location_stats=location_stats)
+        row = s.query(Lead.id, Lead.message).filter(Lead.id == lead_id).first()
+    finally:
+        s.close()
+    if row is None:
+        abort(404)
+    return jsonify({'id': row.id, 'message': row.message or ''})
+
+
+@app.route('/admin/export/<table>')
+@admin_required
+def admin_export(table):
+    """Stream a table as CSV/NDJSON: ?format=csv|ndjson&gzip=1&since=&until=&state=emailed|failed|pending"""
+    fmt = request.args.get('format', 'ndjson')
+    gz = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    s = SessionLocal()
+    try:
+        chunks = export.stream(s, table, fmt=fmt, gzip=gz, since=request.args.get('since'),
+                               until=request.args.get('until'), state=request.args.get('state') or None)
+    except ValueError as e:
+        s.close()
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            s.close()
+
+    app.logger.info(f'Admin export: {table} ({fmt}{", gzip" if gz else ""}) {request.query_string.decode()}')
+    resp = Response(generate(), mimetype='application/gzip' if gz else export.FORMATS[fmt])
+    resp.headers['Content-Disposition'] = f'attachment; filename="{export.filename(table, fmt, gz)}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+BULK_RESEND_LIMIT = 200
+
+
+def _resend_claimed(s, candidates, settings, now):
+    """Take ``candidates`` out of the outbox queue and send them; returns per-lead results.
+    Leads taken from the queue that do not go out are queued again with their retry backoff.
+    """
+    # take them out of the outbox queue with the same compare-and-set the outbox uses to claim:
+    # a lead an outbox claimed after our SELECT no longer matches and is skipped
+    leads, skipped, queued = [], [], set()
+    for lead in candidates:
+        seen = lead.next_attempt_at
+        taken = (seen is None or seen <= now) and s.execute(
+            update(Lead).where(Lead.id == lead.id, Lead.next_attempt_at == seen).values(next_attempt_at=None)
+        ).rowcount == 1
+        (leads if taken else skipped).append(lead)
+        if taken and seen is not None:
+            queued.add(lead.id)
+    s.commit()
+    results = [{'id': lead.id, 'email': lead.email, 'ok': False,
+                'error': 'queued in the outbox (being sent or retry scheduled)'} for lead in skipped]
+    if leads:
+        try:
+            sent = mailer.resend_leads(leads, settings=settings)
+        except Exception as e:
+            sent = [{'id': lead.id, 'email': lead.email, 'ok': False, 'error': str(e)} for lead in leads]
+            for lead in leads:
+                lead.error = str(e)
+        results += sent
+        # in the same commit as their status: a queued lead must not drop out of the retry queue
+        failed = {r['id'] for r in sent if not r['ok']}
+        retry_at = datetime.datetime.utcnow()
+        for lead in leads:
+            if lead.id in failed and lead.id in queued:
+                lead.next_attempt_at = retry_at + datetime.timedelta(seconds=outbox.backoff(lead.attempts or 1))
+        s.commit()
+    return results
+
+
+@app.route('/admin/leads/resend-bulk', methods=['POST'])
+@admin_required
+def admin_resend_bulk():
+    """Resend selected leads (lead_ids) or all failed ones (scope=failed) over a single SMTP session.
+    Leads the outbox has leased or scheduled (next_attempt_at in the future) are skipped:
+    a worker may be sending them right now. A queued lead that fails here goes back in
+    the outbox queue with its retry backoff.
+    """
+    settings = mailer.smtp_settings()
+    s = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        q = s.query(Lead)
+        if request.form.get('scope') == 'failed':
+            q = q.filter(Lead.emailed.is_(False), Lead.error.isnot(None),
+                         or_(Lead.next_attempt_at.is_(None), Lead.next_attempt_at <= now))
+        else:
+            ids = [int(x) for x in request.form.getlist('lead_ids') if x.isdigit()]
+            if not ids:
+                return redirect(url_for('admin_leads'))
+            q = q.filter(Lead.id.in_(ids))
+        candidates = q.order_by(Lead.id).limit(BULK_RESEND_LIMIT).all()
+        if not candidates:
+            return redirect(url_for('admin_leads'))
+        if not settings:
+            # nothing is taken out of the outbox queue while it cannot be sent
+            results = [{'id': lead.id, 'email': lead.email, 'ok': False, 'error': 'SMTP not configured'}
+                       for lead in candidates]
+        else:
+            results = _resend_claimed(s, candidates, settings, now)
+        ok = sum(1 for r in results if r['ok'])
+        app.logger.info(f"Admin bulk resend: {ok}/{len(results)} leads sent")
+    finally:
+        s.close()
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'results': results, 'sent': ok, 'total': len(results)})
+    return _render_admin_leads(bulk_results=results)
+
+
+@app.route('/admin/geo-cache')
+@admin_required
+def admin_geo_cache_stats():
+    """Hit/miss/eviction counters of this worker's IP -> country cache."""
+    return jsonify(geo_cache.stats())
+
+
+@app.route('/admin/upstreams')
+@admin_required
+def admin_upstream_stats():
+    """Outbound HTTP client counters and circuit state per upstream (this worker only)."""
+    return jsonify(httpclient.shared().stats())
+
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """Recent request profiles (newest first)."""
+    profiles = request_profiler.list() if request_profiler is not None else []
+    return render_template('admin_profiles.html', profiles=profiles, enabled=request_profiler is not None)
+
+
+@app.route('/admin/profiles/<name>.<ext>')
+@admin_required
+def admin_profile_file(name, ext):
+    """One stored profile: .txt (pstats report), .collapsed (flamegraph input) or .json."""
+    path = request_profiler.path_for(name, ext) if request_profiler is not None else None
+    if path is None:
+        abort(404)
+    mimetype = 'application/json' if ext == 'json' else 'text/plain'
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype=mimetype,
+                               as_attachment=(ext == 'collapsed'))
+
 
 @app.route('/admin/leads/resend/<int:lead_id>', methods=['POST'])
 @admin_required
 def admin_resend(lead_id):
     s = SessionLocal()
-    lead = s.get(Lead, lead_id)
-    if not lead:
-        abort(404)
     try:
-        send_contact_email_from_lead(lead)
-        lead.emailed = True
-        lead.emailed_at = datetime.datetime.utcnow()
-        lead.error = None
-        s.commit()
-        app.logger.info(f"Admin resent lead id={lead.id}")
-    except Exception as e:
-        lead.error = str(e)
-        s.commit()
-        app.logger.exception(f"Resend failed for lead id={lead.id}")
+        lead = s.get(Lead, lead_id)
+        if not lead:
+            abort(404)
+        try:
+            send_contact_email_from_lead(lead)
+            lead.emailed = True
+            lead.emailed_at = datetime.datetime.utcnow()
+            lead.error = None
+            lead.next_attempt_at = None
+            s.commit()
+            app.logger.info(f"Admin resent lead id={lead_id}")
+        except Exception as e:
+            lead.error = str(e)
+            s.commit()
+            app.logger.exception(f"Resend failed for lead id={lead_id}")
+    finally:
+        s.close()
     return redirect(url_for('admin_leads'))
 
 @app.route('/admin/leads/delete/<int:lead_id>', methods=['POST'])
 @admin_required
 def admin_delete(lead_id):
     s = SessionLocal()
-    lead = s.get(Lead, lead_id)
-    if not lead:
-        abort(404)
-    s.delete(lead)
-    s.commit()
+    try:
+        lead = s.get(Lead, lead_id)
+        if not lead:
+            abort(404)
+        s.delete(lead)
+        s.commit()
+    finally:
+        s.close()
     app.logger.info(f"Admin deleted lead id={lead_id}")
     return redirect(url_for('admin_leads'))
 
 
+_app_ready = False
+
+
+def setup_app():
+    """Finish the one-time setup of the module-level ``app`` and return it; later calls are no-ops.
+
+    This is an idempotent setup hook, not an app factory: there is one ``app``
+    per process, built when this module is imported (together with the .env
+    loading and the translation tables), and every call returns that same
+    object. The work that touches disk happens here: DB schema, log file
+    handler, asset manifest with its precompressed variants, and the optional
+    profiler. With gunicorn's
+    preload_app (gunicorn.conf.py) this runs once in the master and the workers
+    share the result copy-on-write. Per-process state (DB connections,
+    background threads, pooled sockets) is re-created in each worker after fork.
+    """
+    global _app_ready, asset_manifest, request_profiler
+    if _app_ready:
+        return app
+
+    # initialize DB (creates data dir and sqlite file)
+    init_db()
+    # compile GEOIP_CSV if it changed and open the range database (warns when there is none)
+    geoip.prepare()
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024, backupCount=5)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    file_handler.setLevel(logging.INFO)
+    app.logger.addHandler(file_handler)
+    app.logger.setLevel(logging.INFO)
+    app.logger.info(f"Logging initialized. Log file: {log_path}")
+
+    asset_manifest = assets.from_env(STATIC_DIR, DATA_DIR)
+    app.add_template_global(asset_manifest.url, 'asset_url')
+    # compressed once here, no per-request CPU
+    for rel, hashed in asset_manifest.manifest.items():
+        try:
+            static_precompressed.add(hashed, os.path.join(STATIC_DIR, rel))
+        except OSError:
+            pass
+
+    request_profiler = profiler.from_env(LOG_DIR)
+    if request_profiler is not None:
+        request_profiler.init_app(app)
+
+    _app_ready = True
+    return app
+
+
+# `gunicorn app:app`, `from app import app` and the dev server get the finished app as well
+setup_app()
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     # Use 0.0.0.0 so container/remote can reach the dev server; default port can be overridden by PORT env var
@@ -0,0 +1,127 @@
+"""Content-hashed URLs for files under static/.
+
+At startup every file under static/ is hashed and mapped to a fingerprinted
+name (``js/deploy.js`` -> ``js/deploy.3f2a1b4c5d.js``). Templates use
+``asset_url('js/deploy.js')`` and the fingerprinted URL is served from
+/static/a/ with ``Cache-Control: public, max-age=31536000, immutable``.
+
+Each fingerprinted file is also copied into an archive directory on the data
+volume (ASSET_ARCHIVE_DIR, default data/assets), so during a rolling deploy a
+page rendered by a new pod can be served its assets by an old pod and vice
+versa. Unknown hashes fall back to the current file with a short max-age
+instead of a 404.
+
+Configuration (environment):
+  ASSET_ARCHIVE_DIR        where fingerprinted copies are kept ('' disables)
+  ASSET_RETENTION_DAYS     archived copies older than this are pruned at startup (default 30)
+"""
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+FALLBACK = 'public, max-age=300'
+_HASHED_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[^./]+)$')
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()[:10]
+
+
+def hashed_name(rel_path, digest):
+    directory, base = os.path.split(rel_path)
+    stem, ext = os.path.splitext(base)
+    return os.path.join(directory, f'{stem}.{digest}{ext}').replace(os.sep, '/')
+
+
+class AssetManifest:
+
+    def __init__(self, static_dir, archive_dir=None, retention_days=30):
+        self.static_dir = static_dir
+        self.archive_dir = archive_dir or None
+        self.retention_days = retention_days
+        self.manifest = {}   # 'js/deploy.js' -> 'js/deploy.<hash>.js'
+        self._current = {}   # hashed -> original (this build)
+
+    def build(self):
+        manifest = {}
+        for root, _dirs, files in os.walk(self.static_dir):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, self.static_dir).replace(os.sep, '/')
+                manifest[rel] = hashed_name(rel, file_hash(full))
+        self.manifest = manifest
+        self._current = {v: k for k, v in manifest.items()}
+        if self.archive_dir:
+            try:
+                self._archive()
+            except OSError as e:
+                logger.warning(f'Asset archive disabled: {e}')
+                self.archive_dir = None
+        return manifest
+
+    def _archive(self):
+        for rel, hashed in self.manifest.items():
+            dest = os.path.join(self.archive_dir, hashed)
+            if os.path.exists(dest):
+                # touch so retention counts from the last deploy that used it
+                os.utime(dest, None)
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = f'{dest}.{os.getpid()}.tmp'
+            shutil.copyfile(os.path.join(self.static_dir, rel), tmp)
+            os.replace(tmp, dest)
+        cutoff = time.time() - self.retention_days * 86400
+        for root, _dirs, files in os.walk(self.archive_dir):
+            for name in files:
+                full = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(full) < cutoff:
+                        os.remove(full)
+                except OSError:
+                    pass
+
+    def url(self, rel_path):
+        """Template helper: fingerprinted URL for a file under static/."""
+        rel_path = rel_path.lstrip('/')
+        hashed = self.manifest.get(rel_path)
+        if hashed is None:
+            return '/static/' + rel_path
+        return '/static/a/' + hashed
+
+    def resolve(self, hashed):
+        """Return (directory, filename, cache_control) for a /static/a/ path, or None."""
+        original = self._current.get(hashed)
+        if original is not None:
+            return self.static_dir, original, IMMUTABLE
+        if self.archive_dir and os.path.isfile(os.path.join(self.archive_dir, hashed)):
+            # built by another release still running during a rolling deploy
+            return self.archive_dir, hashed, IMMUTABLE
+        m = _HASHED_RE.match(hashed)
+        if m:
+            original = m.group('stem') + m.group('ext')
+            if original in self.manifest:
+                return self.static_dir, original, FALLBACK
+        return None
+
+
+def from_env(static_dir, data_dir):
+    archive_dir = os.environ.get('ASSET_ARCHIVE_DIR', os.path.join(data_dir, 'assets'))
+    try:
+        retention = int(os.environ.get('ASSET_RETENTION_DAYS', 30))
+    except ValueError:
+        retention = 30
+    manifest = AssetManifest(static_dir, archive_dir=archive_dir, retention_days=retention)
+    manifest.build()
+    return manifest
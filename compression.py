@@ -0,0 +1,158 @@
+"""Response compression with Accept-Encoding negotiation.
+
+Static: fingerprinted assets are compressed once at startup (gzip at level 9,
+brotli at quality 11 when the optional ``brotli`` package is installed), so
+serving them costs no CPU per request.
+
+Dynamic: an after_request hook compresses HTML/JSON/text responses above a
+size threshold with a latency-oriented level. Bodies that carry a strong ETag
+(e.g. pages from pagecache) are compressed once per (ETag, encoding) and kept
+in a small LRU. Streams (SSE) and already-encoded responses are left alone.
+The ETag of a compressed response gets an ``-<encoding>`` suffix so encodings
+are never confused by caches.
+
+Configuration (environment):
+  COMPRESS                 0 to disable dynamic compression (default 1)
+  COMPRESS_MIN_SIZE        bytes below which responses are sent as-is (default 1024)
+  COMPRESS_GZIP_LEVEL      gzip level for dynamic responses (default 5)
+  COMPRESS_BROTLI_QUALITY  brotli quality for dynamic responses (default 4)
+"""
+import os
+import gzip
+import threading
+from collections import OrderedDict
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/xml', 'application/json',
+    'application/javascript', 'text/javascript', 'image/svg+xml', 'application/xml',
+}
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.svg', '.json', '.txt', '.html', '.map', '.xml')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # mtime=0 keeps output deterministic for identical input
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def negotiate(accept_encodings, available):
+    """Pick the best encoding the client accepts among ``available`` (preference order)."""
+    for enc in available:
+        if accept_encodings[enc] > 0:
+            return enc
+    return None
+
+
+class StaticPrecompressed:
+    """Precompressed variants of static files, built once."""
+
+    def __init__(self):
+        self._variants = {}  # path -> {'gzip': bytes, 'br': bytes}
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def add(self, key, path):
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with open(path, 'rb') as f:
+            raw = f.read()
+        variants = {}
+        for enc in self.encodings:
+            data = compress(raw, enc, 11 if enc == 'br' else 9)
+            if len(data) < len(raw):
+                variants[enc] = data
+        if variants:
+            self._variants[key] = variants
+
+    def pick(self, key, accept_encodings):
+        """Return (encoding, bytes) for the best acceptable variant, or (None, None)."""
+        variants = self._variants.get(key)
+        if not variants:
+            return None, None
+        enc = negotiate(accept_encodings, [e for e in self.encodings if e in variants])
+        if enc is None:
+            return None, None
+        return enc, variants[enc]
+
+    def has(self, key):
+        return key in self._variants
+
+
+class DynamicCompressor:
+
+    def __init__(self, min_size=1024, gzip_level=5, brotli_quality=4, cache_size=256, enabled=True):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.enabled = enabled
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._cache = OrderedDict()  # (etag, enc) -> bytes
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.cache_hits = 0
+
+    def _level(self, enc):
+        return self.brotli_quality if enc == 'br' else self.gzip_level
+
+    def __call__(self, response, request):
+        """after_request hook."""
+        if self.enabled and response.status_code == 304 and response.get_etag()[0]:
+            # a 304 must carry the same Vary as the 200 it revalidates
+            response.vary.add('Accept-Encoding')
+            return response
+        if not self.enabled or response.status_code != 200 or response.direct_passthrough \
+                or response.is_streamed or 'Content-Encoding' in response.headers \
+                or response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        enc = negotiate(request.accept_encodings, self.encodings)
+        if enc is None:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        data = None
+        if etag and not weak:
+            with self._lock:
+                data = self._cache.get((etag, enc))
+                if data is not None:
+                    self._cache.move_to_end((etag, enc))
+                    self.cache_hits += 1
+        if data is None:
+            data = compress(body, enc, self._level(enc))
+            self.compressed += 1
+            if etag and not weak:
+                with self._lock:
+                    self._cache[(etag, enc)] = data
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+        if len(data) >= len(body):
+            return response
+        response.set_data(data)
+        response.headers['Content-Encoding'] = enc
+        if etag:
+            response.set_etag(f'{etag}-{enc}', weak=weak)
+        return response
+
+
+def from_env():
+    return DynamicCompressor(
+        min_size=_env_int('COMPRESS_MIN_SIZE', 1024),
+        gzip_level=_env_int('COMPRESS_GZIP_LEVEL', 5),
+        brotli_quality=_env_int('COMPRESS_BROTLI_QUALITY', 4),
+        enabled=os.environ.get('COMPRESS', '1').lower() not in ('0', 'false', 'no'),
+    )
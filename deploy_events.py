@@ -0,0 +1,176 @@
+"""Server-Sent Events fan-out of GitHub Actions run changes.
+
+One watcher thread per worker polls the shared status cache (ghstatus) and
+turns consecutive payloads into diffs (added / changed runs, removed ids).
+Each /api/github-actions/stream client gets a full snapshot once and then only
+the diffs, instead of every tab polling the JSON endpoint every 30 s.
+
+Configuration (environment):
+  DEPLOY_STREAM_POLL         seconds between cache checks while clients are connected (default 10)
+  DEPLOY_STREAM_MAX_CLIENTS  concurrent streams per worker (default 20)
+  DEPLOY_STREAM_MAX_SECONDS  a stream is closed after this long; EventSource reconnects (default 300)
+"""
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# fields whose change is pushed to clients
+_TRACKED = ('status', 'conclusion', 'updated_at', 'name', 'head_commit')
+
+
+def diff_runs(old_runs, new_runs):
+    """Return {'added': [...], 'changed': [...], 'removed': [ids]} or None when nothing changed."""
+    old = {r['id']: r for r in old_runs or []}
+    new = {r['id']: r for r in new_runs or []}
+    added = [r for rid, r in new.items() if rid not in old]
+    changed = [r for rid, r in new.items() if rid in old and any(old[rid].get(k) != r.get(k) for k in _TRACKED)]
+    removed = [rid for rid in old if rid not in new]
+    if not (added or changed or removed):
+        return None
+    return {'added': added, 'changed': changed, 'removed': removed}
+
+
+def sse(event, data, event_id=None):
+    """Format one SSE message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def streaming_supported(environ):
+    """A stream pins its worker: only allow it on threaded or cooperative (gevent/eventlet) servers."""
+    if environ.get('wsgi.multithread'):
+        return True
+    mod = getattr(socket.socket, '__module__', '') or ''
+    return mod.startswith(('gevent', 'eventlet'))
+
+
+class RunsWatcher:
+
+    def __init__(self, get_payload, interval=10, max_clients=20):
+        self.get_payload = get_payload
+        self.interval = interval
+        self.max_clients = max_clients
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.runs = None   # last seen runs list
+        self.seq = 0
+        self.broadcasts = 0
+
+    def _ensure_started(self):
+        # lazily per process: threads do not survive gunicorn's fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='deploy-runs-watcher', daemon=True)
+        self._thread.start()
+
+    def subscribe(self):
+        """Register a client. Returns (queue, snapshot_runs) or (None, None) when full."""
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None, None
+            self._ensure_started()
+            q = queue.Queue(maxsize=50)
+            self._clients.add(q)
+        if self.runs is None:
+            self.poll()
+        self._wakeup.set()
+        return q, self.runs or []
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._clients.discard(q)
+
+    def poll(self):
+        try:
+            payload, status, _ = self.get_payload()
+        except Exception:
+            logger.exception('Deploy watcher poll failed')
+            return
+        if status != 200 or not payload.get('success'):
+            return
+        new_runs = payload.get('runs') or []
+        with self._lock:
+            changes = diff_runs(self.runs, new_runs) if self.runs is not None else None
+            self.runs = new_runs
+            if not changes:
+                return
+            self.seq += 1
+            self.broadcasts += 1
+            message = (self.seq, changes)
+            for q in list(self._clients):
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    # slow consumer: drop it, EventSource reconnects and gets a fresh snapshot
+                    self._clients.discard(q)
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    q.put_nowait(None)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            with self._lock:
+                active = bool(self._clients)
+            if active:
+                self.poll()
+
+    def stream(self, q, snapshot, max_seconds=300, heartbeat=15):
+        """Generator of SSE text for one subscribed client."""
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield 'retry: 5000\n\n'
+            yield sse('snapshot', {'runs': snapshot}, self.seq)
+            while time.monotonic() < deadline:
+                try:
+                    message = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                if message is None:
+                    break
+                seq, changes = message
+                yield sse('diff', changes, seq)
+            yield sse('end', {'reconnect': True})
+        finally:
+            self.unsubscribe(q)
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._clients), 'broadcasts': self.broadcasts, 'seq': self.seq}
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def from_env(get_payload):
+    return RunsWatcher(
+        get_payload,
+        interval=_env_int('DEPLOY_STREAM_POLL', 10),
+        max_clients=_env_int('DEPLOY_STREAM_MAX_CLIENTS', 20),
+    )
+
+
+def max_stream_seconds():
+    return _env_int('DEPLOY_STREAM_MAX_SECONDS', 300)
@@ -0,0 +1,141 @@
+"""Streaming exports of leads and visit stats as CSV or NDJSON (optionally gzip).
+
+Rows are read with a plain column SELECT and ``yield_per`` (the sqlite cursor
+is consumed in batches, no ORM objects are built) and encoded chunk by chunk,
+so memory stays flat whatever the table size. Used by /admin/export/<table>
+and scripts/export_data.py.
+
+Filters:
+  since / until   ISO date or datetime; leads filter on created_at, the stats
+                  tables on last_seen. A date-only ``until`` includes that day.
+  state           leads only: emailed | failed (not emailed, has error) | pending
+"""
+import io
+import csv
+import json
+import zlib
+import datetime
+
+from sqlalchemy import select
+
+from models import Lead, PageView, AccessLocation
+
+BATCH_SIZE = 1000
+# flush the encoder output roughly this often (bytes)
+CHUNK_SIZE = 64 * 1024
+
+TABLES = {
+    'leads': (Lead, Lead.created_at, [
+        Lead.id, Lead.name, Lead.email, Lead.message, Lead.ip, Lead.created_at,
+        Lead.emailed, Lead.emailed_at, Lead.error, Lead.attempts,
+    ]),
+    'page_views': (PageView, PageView.last_seen, [
+        PageView.path, PageView.count, PageView.first_seen, PageView.last_seen,
+    ]),
+    'access_locations': (AccessLocation, AccessLocation.last_seen, [
+        AccessLocation.country, AccessLocation.count, AccessLocation.first_seen, AccessLocation.last_seen,
+    ]),
+}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+STATES = ('emailed', 'failed', 'pending')
+
+
+def parse_bound(value, end=False):
+    """ISO date/datetime -> datetime. A date-only upper bound means 'through the end of that day'."""
+    if not value:
+        return None
+    value = value.strip()
+    if len(value) == 10:
+        day = datetime.date.fromisoformat(value)
+        if end:
+            day += datetime.timedelta(days=1)
+        return datetime.datetime.combine(day, datetime.time())
+    return datetime.datetime.fromisoformat(value)
+
+
+def build_select(table, since=None, until=None, state=None):
+    """Validated SELECT for an export. Raises ValueError on unknown table/state or bad dates."""
+    if table not in TABLES:
+        raise ValueError(f'unknown table: {table}')
+    model, time_col, columns = TABLES[table]
+    stmt = select(*columns)
+    since_dt = parse_bound(since)
+    until_dt = parse_bound(until, end=True)
+    if since_dt:
+        stmt = stmt.where(time_col >= since_dt)
+    if until_dt:
+        stmt = stmt.where(time_col < until_dt)
+    if state:
+        if model is not Lead or state not in STATES:
+            raise ValueError(f'unsupported state filter: {state}')
+        if state == 'emailed':
+            stmt = stmt.where(Lead.emailed.is_(True))
+        elif state == 'failed':
+            stmt = stmt.where(Lead.emailed.isnot(True), Lead.error.isnot(None))
+        else:
+            stmt = stmt.where(Lead.emailed.isnot(True), Lead.error.is_(None))
+    order = columns[0]
+    return stmt.order_by(order).execution_options(yield_per=BATCH_SIZE), [c.key for c in columns]
+
+
+def _value(v):
+    if isinstance(v, (datetime.datetime, datetime.date)):
+        return v.isoformat()
+    return v
+
+
+def iter_rows(session, stmt):
+    for partition in session.execute(stmt).partitions():
+        for row in partition:
+            yield row
+
+
+def encode_csv(rows, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(['' if v is None else _value(v) for v in row])
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def encode_ndjson(rows, columns):
+    parts, size = [], 0
+    for row in rows:
+        line = json.dumps({k: _value(v) for k, v in zip(columns, row)}, ensure_ascii=False) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def stream(session, table, fmt='ndjson', gzip=False, since=None, until=None, state=None):
+    """Generator of encoded bytes for one export. Validation errors raise before the first chunk."""
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown format: {fmt}')
+    stmt, columns = build_select(table, since=since, until=until, state=state)
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    chunks = encode(iter_rows(session, stmt), columns)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def filename(table, fmt, gzip=False):
+    stamp = datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    return f'{table}_{stamp}.{fmt}' + ('.gz' if gzip else '')
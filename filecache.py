@@ -0,0 +1,152 @@
+"""Small per-process file caches for the /deploy page.
+
+FileCache re-reads a file only when its identity (inode, size, mtime) changes,
+so a page view costs one os.stat per artifact instead of exists + getmtime +
+open/read.
+
+LogTail keeps the last N lines of a growing log in a ring buffer and
+remembers the byte offset it has read up to, so each view only reads the bytes
+appended since the previous one. RotatingFileHandler rollover (app.log ->
+app.log.1, new app.log) is detected by inode change or truncation; the unread
+rest of the rotated file is picked up from app.log.1 before the new file.
+"""
+import os
+import datetime
+import threading
+from collections import deque
+
+
+class FileCache:
+
+    def __init__(self, max_chars=20000):
+        self.max_chars = max_chars
+        self._entries = {}  # path -> (identity, info)
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def get(self, path):
+        """Return {'exists', 'mtime', 'content'} for ``path`` (content truncated to max_chars)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {'exists': False, 'mtime': '', 'content': ''}
+        identity = (st.st_ino, st.st_size, st.st_mtime_ns)
+        cached = self._entries.get(path)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read(self.max_chars + 1)
+            if len(content) > self.max_chars:
+                content = content[:self.max_chars] + '\n\n...content truncated...'
+        except Exception:
+            content = ''
+        info = {
+            'exists': True,
+            'mtime': datetime.datetime.fromtimestamp(st.st_mtime).isoformat(),
+            'content': content,
+        }
+        with self._lock:
+            self._entries[path] = (identity, info)
+            self.reads += 1
+        return info
+
+
+def tail_lines(fpath, n=200):
+    """Read the last ``n`` lines by scanning backwards in doubling blocks. Returns (lines, end_offset)."""
+    with open(fpath, 'rb') as f:
+        f.seek(0, 2)
+        end = size = f.tell()
+        block_size = 1024
+        data = b''
+        while end > 0 and data.count(b'\n') <= n:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+            block_size *= 2
+    return data.splitlines()[-n:], size
+
+
+class LogTail:
+
+    def __init__(self, path, n=200):
+        self.path = path
+        self.n = n
+        self._lines = deque(maxlen=n)
+        self._partial = b''
+        self._inode = None
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.bytes_read = 0
+
+    def _consume(self, data):
+        self.bytes_read += len(data)
+        data = self._partial + data
+        parts = data.split(b'\n')
+        self._partial = parts.pop()
+        for ln in parts:
+            self._lines.append(ln.rstrip(b'\r').decode('utf-8', errors='replace'))
+
+    def _read_from(self, path, offset):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        self._consume(data)
+        return offset + len(data)
+
+    def _seed(self, st):
+        lines, size = tail_lines(self.path, self.n)
+        self._lines.clear()
+        self._partial = b''
+        # tail_lines includes a trailing partial line; keep it partial until its newline arrives
+        if lines and size and not self._ends_with_newline(size):
+            self._partial = lines.pop()
+        for ln in lines:
+            self._lines.append(ln.decode('utf-8', errors='replace'))
+        self._inode = st.st_ino
+        self._offset = size
+
+    def _ends_with_newline(self, size):
+        with open(self.path, 'rb') as f:
+            f.seek(size - 1)
+            return f.read(1) == b'\n'
+
+    def _rotated_path(self):
+        """Return the rotated file that still holds our old inode, if any."""
+        candidate = self.path + '.1'
+        try:
+            if os.stat(candidate).st_ino == self._inode:
+                return candidate
+        except OSError:
+            pass
+        return None
+
+    def read(self):
+        """Return the last N lines as one string, reading only newly appended bytes."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+                if self._inode is None:
+                    self._seed(st)
+                elif st.st_ino != self._inode:
+                    # rollover: finish the old file, then start the new one from the beginning
+                    rotated = self._rotated_path()
+                    if rotated:
+                        self._read_from(rotated, self._offset)
+                    if self._partial:
+                        self._consume(b'\n')
+                    self._inode = st.st_ino
+                    self._offset = self._read_from(self.path, 0)
+                elif st.st_size < self._offset:
+                    # truncated in place (copytruncate): start over
+                    self._seed(st)
+                elif st.st_size > self._offset:
+                    self._offset = self._read_from(self.path, self._offset)
+            except OSError:
+                return '\n'.join(self._lines)
+            return '\n'.join(self._lines)
+
+    @property
+    def offset(self):
+        return self._offset
@@ -0,0 +1,173 @@
+"""Two-tier IP -> country cache.
+
+Tier 1 is a bounded in-process LRU, tier 2 the ``ip_geo_cache`` table in the
+leads SQLite DB, so restarted or freshly forked workers start warm and all
+workers share resolved answers. Failed lookups ('' results) are cached as
+negative entries with a shorter TTL so they are not retried on every visit.
+
+The table costs a SELECT, and on a miss an INSERT + commit, so callers only
+use it for remote resolvers (ipapi.co; ``persist=geoip.resolves_remotely()``).
+A local range-database lookup is cheaper than the table, so those answers stay
+in the LRU and no write happens per new visitor.
+
+Configuration (environment):
+  GEO_CACHE_SIZE          max entries in the in-process LRU (default 10000)
+  GEO_CACHE_TTL           seconds a resolved country stays valid (default 7 days)
+  GEO_CACHE_NEGATIVE_TTL  seconds a failed lookup stays cached (default 1 hour)
+  GEO_CACHE_DB            0 to disable the persistent tier (default 1)
+"""
+import os
+import time
+import datetime
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SessionLocal, IpGeoCache
+
+
+class GeoCache:
+    # purge expired rows from the table every N persisted answers
+    PURGE_EVERY = 1000
+
+    def __init__(self, maxsize=10000, ttl=7 * 86400, negative_ttl=3600, persist=True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.persist = persist
+        self._lru = OrderedDict()  # ip -> (country, expires_at)
+        self._lock = threading.Lock()
+        self._stores = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.db_errors = 0
+
+    def _ttl_for(self, country):
+        return self.ttl if country else self.negative_ttl
+
+    def _remember(self, ip, country, expires_at):
+        with self._lock:
+            self._lru[ip] = (country, expires_at)
+            self._lru.move_to_end(ip)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+    def _get_local(self, ip, now):
+        with self._lock:
+            entry = self._lru.get(ip)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._lru[ip]
+                self.expirations += 1
+                return None
+            self._lru.move_to_end(ip)
+            self.hits += 1
+            if not entry[0]:
+                self.negative_hits += 1
+            return entry[0]
+
+    def _get_persistent(self, ip, now):
+        s = SessionLocal()
+        try:
+            row = s.get(IpGeoCache, ip)
+            if row is None or row.resolved_at is None:
+                return None
+            country = row.country or ''
+            age = (datetime.datetime.utcnow() - row.resolved_at).total_seconds()
+            remaining = self._ttl_for(country) - age
+            if remaining <= 0:
+                return None
+            self._remember(ip, country, now + remaining)
+            with self._lock:
+                self.db_hits += 1
+            return country
+        except Exception:
+            with self._lock:
+                self.db_errors += 1
+            return None
+        finally:
+            s.close()
+
+    def _store_persistent(self, ip, country):
+        s = SessionLocal()
+        try:
+            now = datetime.datetime.utcnow()
+            stmt = sqlite_insert(IpGeoCache).values(ip=ip, country=country, resolved_at=now)
+            stmt = stmt.on_conflict_do_update(index_elements=['ip'], set_={'country': country, 'resolved_at': now})
+            s.execute(stmt)
+            self._stores += 1
+            if self._stores % self.PURGE_EVERY == 0:
+                # negative entries expire first; anything older than the positive TTL is dead
+                cutoff = now - datetime.timedelta(seconds=max(self.ttl, self.negative_ttl))
+                s.query(IpGeoCache).filter(IpGeoCache.resolved_at < cutoff).delete(synchronize_session=False)
+            s.commit()
+        except Exception:
+            s.rollback()
+            with self._lock:
+                self.db_errors += 1
+        finally:
+            s.close()
+
+    def get_or_resolve(self, ip, resolver, persist=True):
+        """Return cached country for ``ip``, calling ``resolver(ip)`` on a miss.
+        ``persist=False`` skips the table for this call (cheap local resolvers).
+        """
+        now = time.time()
+        country = self._get_local(ip, now)
+        if country is not None:
+            return country
+        persist = self.persist and persist
+        if persist:
+            country = self._get_persistent(ip, now)
+            if country is not None:
+                return country
+        with self._lock:
+            self.misses += 1
+        country = resolver(ip) or ''
+        self._remember(ip, country, now + self._ttl_for(country))
+        if persist:
+            self._store_persistent(ip, country)
+        return country
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.db_hits + self.misses
+            return {
+                'size': len(self._lru),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'db_errors': self.db_errors,
+                'hit_ratio': round((self.hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def from_env():
+    return GeoCache(
+        maxsize=_env_int('GEO_CACHE_SIZE', 10000),
+        ttl=_env_int('GEO_CACHE_TTL', 7 * 86400),
+        negative_ttl=_env_int('GEO_CACHE_NEGATIVE_TTL', 3600),
+        persist=os.environ.get('GEO_CACHE_DB', '1').lower() not in ('0', 'false', 'no'),
+    )
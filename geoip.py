@@ -0,0 +1,258 @@
+"""Offline IP -> country lookup.
+
+A range database (CSV rows of ``start,end,country``) is compiled once into a
+compact binary file holding sorted integer arrays for IPv4 and IPv6. The
+binary file is memory-mapped read-only, so every gunicorn worker shares the
+same page-cache pages, and a lookup is a single binary search.
+
+Supported CSV inputs: dotted/colon notation (DB-IP lite, ``1.0.0.0,1.0.0.255,AU``)
+or integer bounds (IP2Location LITE, ``"16777216","16777471","AU",...``).
+
+With the local provider and no compiled database, lookups go to ipapi.co
+(and a warning is logged at startup) rather than silently resolving nothing.
+
+Configuration (environment):
+  GEOIP_PROVIDER        local (default) | ipapi | off
+  GEOIP_DB              compiled database path (default data/geoip.bin)
+  GEOIP_CSV             optional CSV source; recompiled at startup (prepare()) when newer than GEOIP_DB
+  GEOIP_IPAPI_FALLBACK  1 to ask ipapi.co when the local database has no answer
+  GEOIP_IPAPI_URL       base URL of the ipapi.co-compatible service (default https://ipapi.co)
+"""
+import os
+import csv
+import mmap
+import sys
+import bisect
+import logging
+import struct
+import threading
+import ipaddress
+from array import array
+
+import httpclient
+
+logger = logging.getLogger(__name__)
+BASE_DIR = os.path.dirname(__file__)
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'data', 'geoip.bin')
+IPAPI_URL = os.environ.get('GEOIP_IPAPI_URL', 'https://ipapi.co').rstrip('/')
+
+# file layout: header | v4 starts (u32) | v4 ends (u32) | v6 starts (u128 BE) | v6 ends (u128 BE) | v4 cc | v6 cc
+_MAGIC = b'GEOIP1' + (b'L' if sys.byteorder == 'little' else b'B') + b'\0'
+_HEADER = struct.Struct('<8sII')
+_V4_MAPPED_LO = int(ipaddress.IPv6Address('::ffff:0.0.0.0'))
+_V4_MAPPED_HI = int(ipaddress.IPv6Address('::ffff:255.255.255.255'))
+
+
+class _U128Array:
+    """Read-only sequence view of big-endian 128-bit integers (bisect-compatible)."""
+    __slots__ = ('_buf',)
+
+    def __init__(self, buf):
+        self._buf = buf
+
+    def __len__(self):
+        return len(self._buf) // 16
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return int.from_bytes(self._buf[i * 16:(i + 1) * 16], 'big')
+
+
+class GeoIPDatabase:
+    """Memory-mapped compiled range database."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n4, n6 = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path}: not a geoip database for this platform')
+        mv = memoryview(self._mm)
+        off = _HEADER.size
+        self._v4_start = mv[off:off + 4 * n4].cast('I')
+        off += 4 * n4
+        self._v4_end = mv[off:off + 4 * n4].cast('I')
+        off += 4 * n4
+        self._v6_start = _U128Array(mv[off:off + 16 * n6])
+        off += 16 * n6
+        self._v6_end = _U128Array(mv[off:off + 16 * n6])
+        off += 16 * n6
+        self._v4_cc = mv[off:off + 2 * n4]
+        off += 2 * n4
+        self._v6_cc = mv[off:off + 2 * n6]
+        self.v4_ranges = n4
+        self.v6_ranges = n6
+
+    def lookup(self, ip: str) -> str:
+        """Return ISO country code for ``ip`` or '' when unknown."""
+        try:
+            addr = ipaddress.ip_address(ip.strip())
+        except (ValueError, AttributeError):
+            return ''
+        if addr.version == 6 and addr.ipv4_mapped:
+            addr = addr.ipv4_mapped
+        key = int(addr)
+        if addr.version == 4:
+            starts, ends, cc = self._v4_start, self._v4_end, self._v4_cc
+        else:
+            starts, ends, cc = self._v6_start, self._v6_end, self._v6_cc
+        i = bisect.bisect_right(starts, key) - 1
+        if i < 0 or key > ends[i]:
+            return ''
+        return bytes(cc[2 * i:2 * i + 2]).decode('ascii', errors='ignore').rstrip('\0')
+
+
+def _parse_bound(value):
+    """Parse a CSV range bound into (version, int)."""
+    value = value.strip().strip('"')
+    if '.' in value or ':' in value:
+        addr = ipaddress.ip_address(value)
+        return addr.version, int(addr)
+    n = int(value)
+    return (4 if n <= 0xFFFFFFFF else 6), n
+
+
+def compile_csv(csv_path, out_path=None):
+    """Compile a CSV range file into the binary format. Returns (v4, v6) range counts."""
+    out_path = out_path or DEFAULT_DB_PATH
+    v4, v6 = [], []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            try:
+                ver_s, start = _parse_bound(row[0])
+                ver_e, end = _parse_bound(row[1])
+            except ValueError:
+                # header line or garbage
+                continue
+            cc = row[2].strip().strip('"').upper()[:2]
+            if not cc or cc in ('-', 'ZZ') or end < start:
+                continue
+            if ver_s == 4 and ver_e == 4:
+                v4.append((start, end, cc))
+            else:
+                v6.append((start, end, cc))
+                # IPv4-mapped IPv6 ranges (IP2Location v6 files) also answer plain IPv4 lookups
+                if start >= _V4_MAPPED_LO and end <= _V4_MAPPED_HI:
+                    v4.append((start - _V4_MAPPED_LO, end - _V4_MAPPED_LO, cc))
+    v4.sort()
+    v6.sort()
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(v4), len(v6)))
+        array('I', (r[0] for r in v4)).tofile(f)
+        array('I', (r[1] for r in v4)).tofile(f)
+        f.write(b''.join(r[0].to_bytes(16, 'big') for r in v6))
+        f.write(b''.join(r[1].to_bytes(16, 'big') for r in v6))
+        f.write(b''.join(r[2].encode('ascii').ljust(2, b'\0') for r in v4))
+        f.write(b''.join(r[2].encode('ascii').ljust(2, b'\0') for r in v6))
+    # atomic swap so running workers keep their old mapping intact
+    os.replace(tmp_path, out_path)
+    return len(v4), len(v6)
+
+
+_db = None
+_db_loaded = False
+_db_lock = threading.Lock()
+
+
+def _provider():
+    return (os.environ.get('GEOIP_PROVIDER') or 'local').lower()
+
+
+def _ipapi_fallback():
+    return os.environ.get('GEOIP_IPAPI_FALLBACK', '0').lower() in ('1', 'true', 'yes')
+
+
+def get_database():
+    """Open the configured database once per process; None if unavailable. Never compiles."""
+    global _db, _db_loaded
+    if _db_loaded:
+        return _db
+    with _db_lock:
+        if _db_loaded:
+            return _db
+        db_path = os.environ.get('GEOIP_DB') or DEFAULT_DB_PATH
+        try:
+            _db = GeoIPDatabase(db_path) if os.path.exists(db_path) else None
+        except Exception:
+            logger.exception(f'Cannot open GeoIP database {db_path}')
+            _db = None
+        _db_loaded = True
+        return _db
+
+
+def prepare():
+    """Startup step (app.setup_app, scripts): compile GEOIP_CSV when it is newer than
+    GEOIP_DB, then open the database. Keeps compilation out of request handling.
+    """
+    global _db_loaded
+    if _provider() != 'local':
+        return None
+    db_path = os.environ.get('GEOIP_DB') or DEFAULT_DB_PATH
+    csv_path = os.environ.get('GEOIP_CSV')
+    if csv_path and os.path.exists(csv_path):
+        if not os.path.exists(db_path) or os.path.getmtime(csv_path) > os.path.getmtime(db_path):
+            n4, n6 = compile_csv(csv_path, db_path)
+            logger.info(f'Compiled {n4} IPv4 and {n6} IPv6 ranges from {csv_path} into {db_path}')
+            with _db_lock:
+                _db_loaded = False
+    db = get_database()
+    if db is None:
+        logger.warning(f'GEOIP_PROVIDER=local but no GeoIP database at {db_path}; '
+                       f'countries are resolved through {IPAPI_URL} until one is built '
+                       f'(python scripts/build_geoip.py <csv>)')
+    return db
+
+
+def resolves_remotely():
+    """True when a lookup may call ipapi.co (answers worth sharing between workers and restarts)."""
+    provider = _provider()
+    if provider == 'ipapi':
+        return True
+    return provider == 'local' and (get_database() is None or _ipapi_fallback())
+
+
+def lookup_local(ip: str) -> str:
+    db = get_database()
+    if db is None:
+        return ''
+    return db.lookup(ip)
+
+
+def lookup_ipapi(ip: str) -> str:
+    """Return ISO country code for given IP using ipapi.co. Returns empty string on failure.
+    Goes through the shared keep-alive client; while its circuit is open this returns at once.
+    """
+    try:
+        resp = httpclient.shared().get('ipapi', f'{IPAPI_URL}/{ip}/country/', timeout=1.5, connect_timeout=0.5)
+    except httpclient.UpstreamError:
+        return ''
+    return resp.text.strip() if resp.status == 200 else ''
+
+
+def country_for_ip(ip: str) -> str:
+    """Resolve ``ip`` with the configured provider. Returns empty string when unknown."""
+    if not ip or ip.startswith('127.') or ip == '::1':
+        return ''
+    provider = _provider()
+    if provider == 'local':
+        db = get_database()
+        if db is None:
+            # no database built yet: behave like the ipapi provider (warned about in prepare())
+            return lookup_ipapi(ip)
+        country = db.lookup(ip)
+        if country:
+            return country
+        if _ipapi_fallback():
+            return lookup_ipapi(ip)
+        return ''
+    if provider == 'ipapi':
+        return lookup_ipapi(ip)
+    return ''
@@ -0,0 +1,221 @@
+"""Shared cache for the GitHub Actions workflow-runs status.
+
+Every open /deploy tab polls /api/github-actions/status, so without a cache
+N viewers mean N upstream calls. The simplified payload is cached in a JSON
+file under data/ (shared by all gunicorn workers and by replicas on the same
+volume) together with the upstream ETag:
+
+- fresh (age < TTL): served from the cache
+- stale: served immediately while one background thread revalidates
+  (stale-while-revalidate); after TTL + GITHUB_STATUS_STALE_MAX the caller waits
+- revalidation sends If-None-Match; a 304 only bumps fetched_at and does not
+  count against the GitHub rate limit
+- single-flight: one refresh per process (thread lock) and per host (flock on
+  a lock file); other callers re-read the file the winner wrote
+
+Configuration (environment):
+  GITHUB_STATUS_TTL        seconds a payload is fresh (default 30)
+  GITHUB_STATUS_STALE_MAX  extra seconds stale data may be served (default 600)
+  GITHUB_STATUS_CACHE      cache file (default data/github_actions_status.json)
+  GITHUB_TOKEN / GHCR_PAT  optional token for higher rate limits
+"""
+import os
+import json
+import time
+import logging
+import threading
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines: per-process single-flight only
+    fcntl = None
+
+from models import DATA_DIR
+import httpclient
+
+logger = logging.getLogger(__name__)
+
+REPO_OWNER = "nw4f2t4gqz-commits"
+REPO_NAME = "devops-web"
+WORKFLOW_NAME = "docker-publish.yml"
+API_URL = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/actions/workflows/{WORKFLOW_NAME}/runs"
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _simplify_runs(data):
+    runs = []
+    for run in data.get('workflow_runs', []):
+        runs.append({
+            'id': run['id'],
+            'name': run['name'],
+            'status': run['status'],  # queued, in_progress, completed
+            'conclusion': run['conclusion'],  # success, failure, cancelled, skipped
+            'created_at': run['created_at'],
+            'updated_at': run['updated_at'],
+            'html_url': run['html_url'],
+            'head_commit': {
+                'message': run['head_commit']['message'],
+                'author': run['head_commit']['author']['name']
+            } if run.get('head_commit') else None
+        })
+    return {
+        'success': True,
+        'runs': runs,
+        'total_count': data.get('total_count', 0)
+    }
+
+
+def fetch_upstream(etag=None, timeout=5):
+    """One GitHub API call. Returns (http_status, etag, payload_or_None)."""
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "User-Agent": "DevOps-Web-App"
+    }
+    # Optional: Add GitHub token if available (for higher rate limits)
+    github_token = os.environ.get('GITHUB_TOKEN') or os.environ.get('GHCR_PAT')
+    if github_token:
+        headers["Authorization"] = f"Bearer {github_token}"
+    if etag:
+        headers["If-None-Match"] = etag
+
+    # shared keep-alive client; raises httpclient.UpstreamError (incl. open circuit) without a response
+    response = httpclient.shared().get('github', API_URL, headers=headers, params={"per_page": 5}, timeout=timeout)
+    status, new_etag = response.status, response.headers.get('etag')
+    body = response.json() if status == 200 else None
+    if status == 200:
+        return status, new_etag, _simplify_runs(body)
+    return status, new_etag or etag, None
+
+
+class StatusCache:
+
+    def __init__(self, path, ttl=30, stale_max=600, fetcher=fetch_upstream):
+        self.path = path
+        self.ttl = ttl
+        self.stale_max = stale_max
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._mem = None        # last entry read from disk
+        self._mem_mtime = None
+        self.upstream_calls = 0
+        self.not_modified = 0
+
+    # -- file storage -------------------------------------------------------
+    def _read(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mem_mtime:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._mem = json.load(f)
+                self._mem_mtime = mtime
+            except (OSError, ValueError):
+                return self._mem
+        return self._mem
+
+    def _write(self, entry):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp, self.path)
+        self._mem = entry
+        try:
+            self._mem_mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._mem_mtime = None
+
+    # -- refresh ------------------------------------------------------------
+    def _refresh(self):
+        """Revalidate upstream unless another worker just did. Returns the current entry."""
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(self.path + '.lock', 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entry = self._read()
+            if entry and time.time() - entry.get('fetched_at', 0) < self.ttl:
+                # another worker refreshed while we waited for the lock
+                return entry
+            etag = entry.get('etag') if entry else None
+            self.upstream_calls += 1
+            try:
+                status, new_etag, payload = self.fetcher(etag)
+            except Exception as e:
+                logger.warning(f'GitHub status fetch failed: {e}')
+                status, new_etag, payload = None, etag, None
+                error = str(e)
+            else:
+                error = f'GitHub API returned status {status}'
+            now = time.time()
+            if status == 304 and entry and entry.get('payload'):
+                self.not_modified += 1
+                entry = dict(entry, fetched_at=now)
+            elif status == 200 and payload is not None:
+                entry = {'fetched_at': now, 'etag': new_etag, 'status': 200, 'payload': payload}
+            elif entry and entry.get('status') == 200:
+                # upstream error: keep serving the last good payload until the next TTL
+                entry = dict(entry, fetched_at=now, last_error=error)
+            else:
+                entry = {'fetched_at': now, 'etag': None, 'status': 500,
+                         'payload': {'success': False, 'error': error}}
+            self._write(entry)
+            return entry
+        finally:
+            if lock_file is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                finally:
+                    lock_file.close()
+
+    def _refresh_single_flight(self):
+        with self._lock:
+            return self._refresh()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._refresh_single_flight()
+            except Exception:
+                logger.exception('GitHub status background refresh failed')
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='github-status-refresh', daemon=True).start()
+
+    def get(self):
+        """Return (payload, http_status, cache_state) where cache_state is HIT, STALE or MISS."""
+        entry = self._read()
+        if entry:
+            age = time.time() - entry.get('fetched_at', 0)
+            if age < self.ttl:
+                return entry['payload'], entry.get('status', 200), 'HIT'
+            if age < self.ttl + self.stale_max and entry.get('status') == 200:
+                self._refresh_in_background()
+                return entry['payload'], 200, 'STALE'
+        entry = self._refresh_single_flight()
+        return entry['payload'], entry.get('status', 200), 'MISS'
+
+    def stats(self):
+        return {'upstream_calls': self.upstream_calls, 'not_modified': self.not_modified}
+
+
+def from_env():
+    return StatusCache(
+        path=os.environ.get('GITHUB_STATUS_CACHE') or os.path.join(DATA_DIR, 'github_actions_status.json'),
+        ttl=_env_int('GITHUB_STATUS_TTL', 30),
+        stale_max=_env_int('GITHUB_STATUS_STALE_MAX', 600),
+    )
@@ -0,0 +1,93 @@
+"""gunicorn settings shared by the Docker image and local runs (loaded from the working directory).
+
+Command-line flags (e.g. -b, --workers) still override these.
+
+Worker profiles (GUNICORN_WORKER_CLASS):
+  gthread  (default) each worker serves GUNICORN_THREADS requests at once; a request
+           waiting on ipapi, GitHub or SMTP holds one thread, not the whole worker
+  sync     one request per worker (the old behaviour)
+
+gevent/eventlet workers are not supported: the GitHub status cache holds a flock
+across its upstream fetch and the rate-limit counters take fcntl locks, both of
+which block the whole event loop (or deadlock it) when greenlets share a process,
+and the sampling profiler only sees OS threads. Any other value falls back to gthread.
+
+With GUNICORN_PRELOAD (default on) the master imports app.py and runs
+setup_app() (DB schema, asset manifest, precompression) once; workers are
+forked from it and share that memory copy-on-write instead of each importing
+Flask, SQLAlchemy and the app again. Per-process state is re-created in the
+children: the DB engine drops inherited connections (models.py), and the
+outbox, page-stats, deploy-events threads, rate-limit mapping and HTTP pool
+start lazily per pid. Code changes then need a restart, not a HUP.
+
+Configuration (environment):
+  GUNICORN_BIND                 listen address (default 0.0.0.0:5001)
+  GUNICORN_WORKERS              worker processes (default 2)
+  GUNICORN_WORKER_CLASS         gthread | sync (default gthread)
+  GUNICORN_THREADS              threads per gthread worker (default 32)
+  GUNICORN_TIMEOUT              seconds before a stuck worker is restarted (default 30)
+  GUNICORN_KEEPALIVE            keep-alive seconds for idle client connections (default 5)
+  GUNICORN_PRELOAD              1 = load the app in the master before forking (default 1)
+"""
+import gc
+import os
+import sys
+import shutil
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = _env_int('GUNICORN_WORKERS', 2)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread').strip().lower() or 'gthread'
+threads = _env_int('GUNICORN_THREADS', 32)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+preload_app = _env_int('GUNICORN_PRELOAD', 1) == 1
+
+if worker_class not in ('gthread', 'sync'):
+    print(f'gunicorn.conf.py: worker class {worker_class!r} is not supported, using gthread', file=sys.stderr)
+    worker_class = 'gthread'
+if worker_class != 'gthread':
+    # gunicorn silently switches sync workers to gthread when threads > 1
+    threads = 1
+
+
+def _reset_multiproc_dir():
+    """Multi-process Prometheus metrics: start from an empty directory once per master.
+
+    Runs while this file is loaded, i.e. before a preloaded app writes its first
+    metric file (on_starting would be too late: the master has already imported
+    app.py by then). A HUP re-reads this file in the same master; the live
+    workers' files are kept then.
+    """
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not path or os.environ.get('_PROMETHEUS_MULTIPROC_MASTER') == str(os.getpid()):
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ['_PROMETHEUS_MULTIPROC_MASTER'] = str(os.getpid())
+
+
+_reset_multiproc_dir()
+
+
+def when_ready(server):
+    # preloaded app objects go to the permanent generation: the collector no longer
+    # touches them, so their pages stay shared with the workers instead of being copied
+    if preload_app:
+        gc.freeze()
+
+
+def child_exit(server, worker):
+    # drop the dead worker's live gauges (http_requests_in_progress)
+    try:
+        import metrics
+        metrics.mark_process_dead(worker.pid)
+    except Exception:
+        pass
@@ -0,0 +1,82 @@
+"""HyperLogLog sketches for unique-visitor estimates (see pagestats.py).
+
+A sketch is 2**PRECISION one-byte registers (4 KB at the default 12) and
+estimates the number of distinct 64-bit hashes added to it with a standard
+error of about 1.04 / sqrt(2**PRECISION), i.e. ~1.6 %, however many hits it
+has seen. Two sketches merge by taking the register-wise maximum, so sketches
+filled by different gunicorn workers, replicas or days can be combined
+without double counting a visitor seen by several of them.
+
+The serialised form is just the register bytes; SQLite merges stored sketches
+in place with the ``hll_merge(a, b)`` function that models.py registers on
+every connection.
+"""
+import math
+import hashlib
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_REST_BITS = 64 - PRECISION
+_REST_MASK = (1 << _REST_BITS) - 1
+
+
+def hash64(value, salt=b''):
+    """Keyed 64-bit hash of ``value`` (str or bytes); the salt keeps raw IPs out of the sketches."""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8, key=salt[:64]).digest(), 'little')
+
+
+class HyperLogLog:
+    __slots__ = ('registers',)
+
+    def __init__(self, registers=None):
+        if registers is None:
+            self.registers = bytearray(REGISTERS)
+        elif len(registers) != REGISTERS:
+            raise ValueError(f'expected {REGISTERS} registers, got {len(registers)}')
+        else:
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data) if data else cls()
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add_hash(self, h):
+        """Add a 64-bit hash: the top bits pick the register, the rank of the rest updates it."""
+        index = h >> _REST_BITS
+        rank = _REST_BITS - (h & _REST_MASK).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Fold ``other`` (a HyperLogLog or its bytes) into this sketch; returns self."""
+        theirs = other.registers if isinstance(other, HyperLogLog) else other
+        self.registers = bytearray(map(max, self.registers, theirs))
+        return self
+
+    def count(self):
+        m = REGISTERS
+        total = 0.0
+        zeros = 0
+        for r in self.registers:
+            total += 2.0 ** -r
+            if r == 0:
+                zeros += 1
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / total
+        if estimate <= 2.5 * m and zeros:
+            # small cardinalities: linear counting over the empty registers is more accurate
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+def merge_bytes(a, b):
+    """SQLite ``hll_merge``: register-wise maximum of two serialised sketches (NULL-tolerant)."""
+    if not a:
+        return b
+    if not b or len(a) != len(b):
+        return a
+    return bytes(map(max, a, b))
@@ -0,0 +1,311 @@
+"""Shared outbound HTTP client for upstream APIs (ipapi.co, GitHub).
+
+One client per worker process, used by geoip.py and ghstatus.py:
+
+* keep-alive: a ``requests`` Session with a connection pool per host, so
+  repeated calls reuse the TCP+TLS connection (urllib fallback when requests
+  is missing: same API, one connection per call);
+* timeouts: a connect timeout plus a total deadline for the whole call
+  (connect + headers + body), not just a per-read socket timeout;
+* circuit breaker per upstream: after HTTP_BREAKER_FAILURES consecutive
+  failures (connection errors, timeouts, 5xx, 429) calls fail immediately with
+  ``CircuitOpenError`` for HTTP_BREAKER_RESET seconds; then one trial call is
+  let through (half-open) and its result closes or re-opens the circuit;
+* counters per upstream (calls, errors, short-circuits, latency), shown at
+  /admin/upstreams, and the dependency_duration_seconds histogram (metrics.py)
+  with outcome ok / error / open.
+
+Breaker state is per process: each gunicorn worker trips on its own.
+``requests`` is imported on the first call, not at startup (~100 ms of import
+time most workers never need before the first cache miss).
+
+Configuration (environment):
+  HTTP_POOL_SIZE            keep-alive connections per host (default 10)
+  HTTP_CONNECT_TIMEOUT_MS   default connect timeout (default 2000)
+  HTTP_BREAKER_FAILURES     consecutive failures that open a circuit (default 5)
+  HTTP_BREAKER_RESET        seconds a circuit stays open before a trial call (default 30)
+"""
+import os
+import json
+import time
+import threading
+import importlib.util
+from urllib.parse import urlencode
+
+import metrics
+
+_HAS_REQUESTS = importlib.util.find_spec('requests') is not None
+_requests = None  # the module, once imported by _requests_module()
+
+USER_AGENT = 'DevOps-Web-App'
+
+
+def _requests_module():
+    global _requests
+    if _requests is None:
+        import requests
+        _requests = requests
+    return _requests
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class UpstreamError(Exception):
+    """The call did not produce an HTTP response (connection error, timeout, open circuit)."""
+
+
+class UpstreamTimeout(UpstreamError):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'content')
+
+    def __init__(self, status, headers, content):
+        self.status = status
+        self.headers = {k.lower(): v for k, v in headers.items()}
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class CircuitBreaker:
+    """closed -> open after ``failures`` consecutive failures -> half-open after ``reset`` s -> closed."""
+
+    def __init__(self, failures=5, reset=30.0):
+        self.failures = failures
+        self.reset = reset
+        self.consecutive = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset or self._probing:
+                return False
+            self._probing = True  # exactly one trial call while half-open
+            return True
+
+    def success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self._probing or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def abandon(self):
+        """The call got no outcome (interrupted by a BaseException): end a trial call so the
+        breaker cannot stay half-open with ``_probing`` set forever; the next trial waits ``reset``."""
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                self.opened_at = time.monotonic()
+
+
+class _UpstreamStats:
+    __slots__ = ('calls', 'errors', 'short_circuits', 'latency_total', 'latency_max', 'last_error')
+
+    def __init__(self):
+        self.calls = self.errors = self.short_circuits = 0
+        self.latency_total = self.latency_max = 0.0
+        self.last_error = None
+
+
+class HttpClient:
+
+    def __init__(self, pool_size=10, connect_timeout=2.0, breaker_failures=5, breaker_reset=30.0):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.transport = None   # optional callable(method, url, headers, connect_timeout, deadline) -> Response
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    def breaker(self, upstream):
+        with self._lock:
+            b = self._breakers.get(upstream)
+            if b is None:
+                b = self._breakers[upstream] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+                self._stats[upstream] = _UpstreamStats()
+            return b
+
+    def get(self, upstream, url, headers=None, params=None, timeout=5.0, connect_timeout=None):
+        """GET ``url`` on behalf of ``upstream`` (breaker/counter name) within ``timeout`` seconds in total.
+
+        Returns a Response for any HTTP status; raises UpstreamError when there is none.
+        """
+        if params:
+            url += ('&' if '?' in url else '?') + urlencode(params)
+        breaker = self.breaker(upstream)
+        stats = self._stats[upstream]
+        if not breaker.allow():
+            with self._lock:
+                stats.short_circuits += 1
+            with metrics.track(upstream) as t:
+                t.outcome = 'open'
+            raise CircuitOpenError(f'{upstream}: circuit open after {breaker.consecutive} failures')
+
+        hdrs = {'User-Agent': USER_AGENT}
+        hdrs.update(headers or {})
+        connect = min(connect_timeout or self.connect_timeout, timeout)
+        started = time.perf_counter()
+        error = None
+        settled = False
+        try:
+            with metrics.track(upstream) as t:
+                try:
+                    send = self.transport or self._send
+                    resp = send('GET', url, hdrs, connect, time.monotonic() + timeout)
+                except UpstreamError as e:
+                    error = e
+                except Exception as e:
+                    error = UpstreamError(f'{upstream}: {e}')
+                failed = error is not None or resp.status >= 500 or resp.status == 429
+                if failed or resp.status >= 400:
+                    t.outcome = 'error'
+            elapsed = time.perf_counter() - started
+
+            if failed:
+                breaker.failure()
+            else:
+                breaker.success()
+            settled = True
+        finally:
+            if not settled:
+                breaker.abandon()
+        with self._lock:
+            stats.calls += 1
+            stats.latency_total += elapsed
+            stats.latency_max = max(stats.latency_max, elapsed)
+            if failed:
+                stats.errors += 1
+                stats.last_error = str(error) if error is not None else f'HTTP {resp.status}'
+        if error is not None:
+            raise error
+        return resp
+
+    # --- transports ----------------------------------------------------------
+
+    def _requests_session(self):
+        # per process: pooled sockets must not be shared across gunicorn's fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    from requests.adapters import HTTPAdapter
+                    session = _requests_module().Session()
+                    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session, self._pid = session, os.getpid()
+        return self._session
+
+    def _send(self, method, url, headers, connect_timeout, deadline):
+        remaining = deadline - time.monotonic()
+        if _HAS_REQUESTS:
+            session = self._requests_session()
+            try:
+                r = session.request(method, url, headers=headers, stream=True,
+                                    timeout=(connect_timeout, remaining))
+            except _requests.Timeout as e:
+                raise UpstreamTimeout(str(e)) from e
+            except _requests.RequestException as e:
+                raise UpstreamError(str(e)) from e
+            try:
+                chunks = []
+                for chunk in r.iter_content(16384):
+                    chunks.append(chunk)
+                    if time.monotonic() > deadline:
+                        raise UpstreamTimeout(f'{url}: deadline exceeded while reading the body')
+                return Response(r.status_code, r.headers, b''.join(chunks))
+            except _requests.RequestException as e:
+                raise UpstreamError(str(e)) from e
+            finally:
+                r.close()
+
+        import urllib.error
+        import urllib.request
+        req = urllib.request.Request(url, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=max(0.001, min(connect_timeout, remaining))) as r:
+                body = r.read()
+                status, resp_headers = r.status, r.headers
+        except urllib.error.HTTPError as e:
+            status, resp_headers, body = e.code, e.headers, e.read()
+        except OSError as e:
+            raise UpstreamError(str(e)) from e
+        if time.monotonic() > deadline:
+            raise UpstreamTimeout(f'{url}: deadline exceeded')
+        return Response(status, dict(resp_headers.items()), body)
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for name, s in self._stats.items():
+                b = self._breakers[name]
+                out[name] = {
+                    'state': b.state,
+                    'consecutive_failures': b.consecutive,
+                    'calls': s.calls,
+                    'errors': s.errors,
+                    'short_circuits': s.short_circuits,
+                    'avg_ms': round(s.latency_total / s.calls * 1000, 2) if s.calls else 0.0,
+                    'max_ms': round(s.latency_max * 1000, 2),
+                    'last_error': s.last_error,
+                }
+            return out
+
+
+def from_env():
+    return HttpClient(
+        pool_size=_env_int('HTTP_POOL_SIZE', 10),
+        connect_timeout=_env_int('HTTP_CONNECT_TIMEOUT_MS', 2000) / 1000.0,
+        breaker_failures=_env_int('HTTP_BREAKER_FAILURES', 5),
+        breaker_reset=float(_env_int('HTTP_BREAKER_RESET', 30)),
+    )
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """The process-wide client used by geoip and ghstatus."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = from_env()
+    return _shared
@@ -0,0 +1,256 @@
+"""Live follow of log/app.log with byte-offset cursors.
+
+A cursor is ``<inode>:<offset>``: the file identity plus the byte offset just
+after the last complete line the client has seen. It is sent as the SSE event
+id, so a reconnecting EventSource resumes exactly where it left off through
+Last-Event-ID. Rollover to app.log.1 is followed by finding the cursor's inode
+there and finishing that file before continuing with the new app.log.
+
+Filters run server side: ``level`` (minimum level, continuation lines such as
+tracebacks inherit the level of the line they belong to) and ``q`` (substring).
+
+The stream is public like /deploy, so it never reaches further back than the
+page does: a cursor before the start of the last ``backlog_lines`` lines (the
+/deploy tail window) is moved up to it. Older history in app.log / app.log.1
+is not served. Bytes read are charged to the client (remote address) over
+LOG_STREAM_BUDGET_SECONDS, so reconnecting does not reset the cap; budgets are
+kept per worker. Connections are also capped in duration, and each worker in
+concurrent followers.
+
+Configuration (environment):
+  LOG_STREAM_MAX_BYTES       bytes a client may read per budget period (default 1 MiB)
+  LOG_STREAM_BUDGET_SECONDS  budget period (default 3600)
+  LOG_STREAM_MAX_SECONDS     connection lifetime (default 300)
+  LOG_STREAM_MAX_CLIENTS     concurrent followers per worker (default 5)
+"""
+import os
+import time
+import json
+import threading
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+READ_CHUNK = 64 * 1024
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def format_cursor(inode, offset):
+    return f'{inode}:{offset}'
+
+
+def parse_cursor(value):
+    """Return (inode, offset) or None for a missing/malformed cursor."""
+    try:
+        inode, offset = value.split(':', 1)
+        return int(inode), max(0, int(offset))
+    except (AttributeError, ValueError):
+        return None
+
+
+def line_level(line):
+    """Level name of a '%(asctime)s %(levelname)s %(name)s: ...' line, or None for continuation lines."""
+    parts = line.split(' ', 3)
+    if len(parts) >= 3 and parts[2] in LEVELS:
+        return parts[2]
+    return None
+
+
+def window_start(path, n):
+    """Byte offset at which the last ``n`` lines of ``path`` begin."""
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        start = f.tell()
+        data = b''
+        block = 4096
+        while start > 0 and data.count(b'\n') <= n:
+            new = max(0, start - block)
+            f.seek(new)
+            data = f.read(start - new) + data
+            start = new
+            block *= 2
+    # a trailing newline ends the last line, it does not start another one
+    cut = len(data) - 1 if data.endswith(b'\n') else len(data)
+    for _ in range(n):
+        cut = data.rfind(b'\n', 0, cut)
+        if cut < 0:
+            return start
+    return start + cut + 1
+
+
+class _ClientBudget:
+    """Bytes each client may read per ``period`` seconds, across reconnects."""
+
+    def __init__(self, max_bytes, period):
+        self.max_bytes = max_bytes
+        self.period = period
+        self._used = {}  # client -> [period start, bytes read]
+        self._lock = threading.Lock()
+
+    def _entry(self, client, now):
+        entry = self._used.get(client)
+        if entry is None or now - entry[0] >= self.period:
+            if len(self._used) >= 10000:
+                self._used = {k: v for k, v in self._used.items() if now - v[0] < self.period}
+            entry = self._used[client] = [now, 0]
+        return entry
+
+    def remaining(self, client):
+        with self._lock:
+            return max(0, self.max_bytes - self._entry(client, time.monotonic())[1])
+
+    def charge(self, client, n):
+        with self._lock:
+            self._entry(client, time.monotonic())[1] += n
+
+
+class _Limiter:
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.max_clients:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class LogFollower:
+
+    def __init__(self, path, max_bytes=1024 * 1024, max_seconds=300, max_clients=5, poll_interval=0.5,
+                 budget_seconds=3600, backlog_lines=200):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.poll_interval = poll_interval
+        self.backlog_lines = backlog_lines
+        self.clients = _Limiter(max_clients)
+        self.budgets = _ClientBudget(max_bytes, budget_seconds)
+
+    def current_cursor(self):
+        try:
+            st = os.stat(self.path)
+            return format_cursor(st.st_ino, st.st_size)
+        except OSError:
+            return None
+
+    def _open_at(self, cursor):
+        """Open the file the cursor refers to. Returns (file, inode, offset, is_rotated).
+        The offset is never earlier than the last ``backlog_lines`` lines of that file.
+        """
+        st = os.stat(self.path)
+        if cursor is None:
+            f = open(self.path, 'rb')
+            return f, st.st_ino, st.st_size, False
+        inode, offset = cursor
+        if inode == st.st_ino:
+            f = open(self.path, 'rb')
+            # truncated since the client saw it: start over
+            offset = offset if offset <= st.st_size else 0
+            return f, inode, max(offset, window_start(self.path, self.backlog_lines)), False
+        rotated = self.path + '.1'
+        try:
+            if os.stat(rotated).st_ino == inode:
+                return (open(rotated, 'rb'), inode, max(offset, window_start(rotated, self.backlog_lines)),
+                        True)
+        except OSError:
+            pass
+        # cursor's file is gone (rotated further): continue from the tail window of the current file
+        return open(self.path, 'rb'), st.st_ino, window_start(self.path, self.backlog_lines), False
+
+    def follow(self, cursor=None, level=None, q=None, client=None):
+        """Generator of SSE messages with new (filtered) lines. Caller must hold a client slot.
+        Bytes read are charged to ``client``'s budget.
+        """
+        min_level = LEVELS.get((level or '').upper(), 0)
+        deadline = time.monotonic() + self.max_seconds
+        budget = self.budgets.remaining(client)
+        last_level = None
+        f = None
+        try:
+            yield 'retry: 3000\n\n'
+            f, inode, offset, rotated = self._open_at(cursor)
+            f.seek(offset)
+            partial = b''
+            idle = 0.0
+            while time.monotonic() < deadline and budget > 0:
+                data = f.read(min(READ_CHUNK, budget))
+                if data:
+                    idle = 0.0
+                    self.budgets.charge(client, len(data))
+                    # other connections of the same client draw on the same budget
+                    budget = self.budgets.remaining(client)
+                    data = partial + data
+                    cut = data.rfind(b'\n') + 1
+                    partial = data[cut:]
+                    offset += cut
+                    out = []
+                    for raw in data[:cut].split(b'\n')[:-1]:
+                        line = raw.rstrip(b'\r').decode('utf-8', errors='replace')
+                        lvl = line_level(line)
+                        if lvl is not None:
+                            last_level = lvl
+                        if min_level and LEVELS.get(last_level, 0) < min_level:
+                            continue
+                        if q and q not in line:
+                            continue
+                        out.append(line)
+                    if out:
+                        yield (f'id: {format_cursor(inode, offset)}\nevent: lines\n'
+                               f'data: {json.dumps(out, separators=(",", ":"))}\n\n')
+                    else:
+                        # everything filtered out: still advance the client's Last-Event-ID
+                        yield f'id: {format_cursor(inode, offset)}\n\n'
+                    continue
+
+                # at EOF: switch files after rollover, otherwise wait for more data
+                if rotated:
+                    f.close()
+                    f = open(self.path, 'rb')
+                    inode, offset, rotated, partial = os.fstat(f.fileno()).st_ino, 0, False, b''
+                    continue
+                try:
+                    st = os.stat(self.path)
+                except OSError:
+                    st = None
+                if st is not None and st.st_ino != inode:
+                    # rolled over under us: drain whatever is left, then move on
+                    rotated = True
+                    continue
+                if st is not None and st.st_size < offset:
+                    f.seek(0)
+                    offset, partial = 0, b''
+                    continue
+                time.sleep(self.poll_interval)
+                idle += self.poll_interval
+                if idle >= 15:
+                    idle = 0.0
+                    yield ': ping\n\n'
+            reason = 'bytes' if budget <= 0 else 'timeout'
+            yield f'event: end\ndata: {json.dumps({"reason": reason, "cursor": format_cursor(inode, offset)})}\n\n'
+        except OSError as e:
+            yield f'event: error\ndata: {json.dumps({"error": str(e)})}\n\n'
+        finally:
+            if f is not None:
+                f.close()
+
+
+def from_env(path):
+    return LogFollower(
+        path,
+        max_bytes=_env_int('LOG_STREAM_MAX_BYTES', 1024 * 1024),
+        budget_seconds=_env_int('LOG_STREAM_BUDGET_SECONDS', 3600),
+        max_seconds=_env_int('LOG_STREAM_MAX_SECONDS', 300),
+        max_clients=_env_int('LOG_STREAM_MAX_CLIENTS', 5),
+    )
@@ -0,0 +1,353 @@
+"""Contact email delivery: shared SMTP path and the lead outbox.
+
+``/contact`` only persists the Lead with ``next_attempt_at`` set (queued) and
+returns. An OutboxWorker drains queued leads over one persistent SMTP
+connection, retries failures with exponential backoff and records
+``emailed`` / ``emailed_at`` / ``error`` on the lead. Queue state lives in the
+leads table, so a restart simply resumes with the leads still queued.
+
+Each lead is claimed with a conditional UPDATE (lease) before sending, so
+several gunicorn workers or a standalone ``scripts/outbox_worker.py`` can run
+outboxes side by side without sending the same lead twice.
+
+If SMTP accepted a message but recording that fails (DB locked, disk full),
+the lead id is kept in memory and the sent state is written again before each
+batch, well inside the lease, so no other outbox re-sends it. Only a process
+that dies in that window loses the note; this case is logged as an error.
+Unsent leads from before the outbox are queued once by models.init_db().
+
+Configuration (environment):
+  OUTBOX_MODE            thread (default, in every web worker) | off (use scripts/outbox_worker.py)
+  OUTBOX_POLL_INTERVAL   seconds between queue scans (default 10)
+  OUTBOX_MAX_ATTEMPTS    give up after this many failed attempts (default 8)
+  OUTBOX_BACKOFF_BASE    first retry delay in seconds, doubled per attempt (default 30)
+  OUTBOX_BACKOFF_MAX     retry delay cap in seconds (default 3600)
+
+smtplib and email.message are imported when the first mail is built or sent,
+not at startup.
+"""
+import os
+import time
+import logging
+import datetime
+import threading
+from typing import TYPE_CHECKING
+
+from sqlalchemy import update, func
+
+from models import SessionLocal, Lead
+import metrics
+
+if TYPE_CHECKING:
+    from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def smtp_settings():
+    """Return SMTP settings from env, or None when SMTP is not configured."""
+    settings = {
+        'host': os.environ.get('SMTP_HOST'),
+        'port': _env_int('SMTP_PORT', 587),
+        'user': os.environ.get('SMTP_USER'),
+        'password': os.environ.get('SMTP_PASS'),
+        'to': os.environ.get('EMAIL_TO'),
+    }
+    if not (settings['host'] and settings['user'] and settings['password'] and settings['to']):
+        return None
+    return settings
+
+
+def build_message(lead: Lead, settings) -> 'EmailMessage':
+    from email.message import EmailMessage
+    msg = EmailMessage()
+    msg['Subject'] = f'Kontakt z webu: {lead.name}'
+    msg['From'] = settings['user']
+    msg['To'] = settings['to']
+    if lead.email and '@' in lead.email:
+        msg['Reply-To'] = lead.email
+    body = f"Jméno: {lead.name}\nEmail: {lead.email}\nIP: {lead.ip}\n\n{lead.message}"
+    msg.set_content(body)
+    return msg
+
+
+class SmtpSession:
+    """One authenticated SMTP connection reused across messages.
+    Reconnects transparently when the server dropped an idle session.
+    """
+
+    def __init__(self, settings, timeout=30, idle_check=30):
+        self.settings = settings
+        self.timeout = timeout
+        self.idle_check = idle_check
+        self._smtp = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self):
+        import smtplib
+        self.close()
+        s = smtplib.SMTP(self.settings['host'], self.settings['port'], timeout=self.timeout)
+        try:
+            s.starttls()
+            s.login(self.settings['user'], self.settings['password'])
+        except Exception:
+            try:
+                s.close()
+            except Exception:
+                pass
+            raise
+        self._smtp = s
+        self.connects += 1
+
+    def _alive(self):
+        if self._smtp is None:
+            return False
+        if time.monotonic() - self._last_used < self.idle_check:
+            return True
+        try:
+            return self._smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def send(self, msg):
+        import smtplib
+        with metrics.track('smtp'):
+            if not self._alive():
+                self._connect()
+            try:
+                self._smtp.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, ConnectionError, OSError) as e:
+                # SMTPSenderRefused 421 = server closing the session; retry once on a fresh one
+                if isinstance(e, smtplib.SMTPSenderRefused) and e.smtp_code != 421:
+                    raise
+                self._connect()
+                self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                try:
+                    self._smtp.close()
+                except Exception:
+                    pass
+            self._smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def send_contact_email_from_lead(lead: Lead, smtp: SmtpSession = None):
+    """Pošle email pro záznam Lead; vyhazuje výjimku při selhání.
+    Reuses ``smtp`` when given, otherwise opens a one-off connection.
+    """
+    settings = smtp.settings if smtp is not None else smtp_settings()
+    if not settings:
+        raise RuntimeError("SMTP not configured")
+    msg = build_message(lead, settings)
+    if smtp is not None:
+        smtp.send(msg)
+        return
+    with SmtpSession(settings) as one_off:
+        one_off.send(msg)
+
+
+def resend_leads(leads, settings=None):
+    """Send ``leads`` over one authenticated SMTP session and update their status
+    in memory (the caller commits once). Returns per-lead results:
+    ``[{'id', 'email', 'ok', 'error'}]``.
+    """
+    settings = settings or smtp_settings()
+    if not settings:
+        raise RuntimeError("SMTP not configured")
+    results = []
+    with SmtpSession(settings) as smtp:
+        for lead in leads:
+            try:
+                send_contact_email_from_lead(lead, smtp=smtp)
+                lead.emailed = True
+                lead.emailed_at = datetime.datetime.utcnow()
+                lead.error = None
+                lead.next_attempt_at = None
+                lead.attempts = (lead.attempts or 0) + 1
+                results.append({'id': lead.id, 'email': lead.email, 'ok': True, 'error': None})
+            except Exception as e:
+                lead.error = str(e)
+                lead.attempts = (lead.attempts or 0) + 1
+                results.append({'id': lead.id, 'email': lead.email, 'ok': False, 'error': str(e)})
+                # a broken session must not fail the rest of the batch
+                smtp.close()
+    return results
+
+
+class OutboxWorker:
+    # a claimed lead is retried by another worker if this one dies mid-send
+    LEASE_SECONDS = 300
+
+    def __init__(self, poll_interval=10, max_attempts=8, backoff_base=30, backoff_max=3600, batch_size=20):
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._smtp = None
+        self._unrecorded = {}  # lead id -> emailed_at: delivered, but the commit failed
+        self.sent = 0
+        self.failed = 0
+
+    def backoff(self, attempts):
+        return min(self.backoff_base * (2 ** max(0, attempts - 1)), self.backoff_max)
+
+    def notify(self):
+        """Wake the delivery thread (a lead was just queued)."""
+        self._wakeup.set()
+
+    def ensure_started(self):
+        # lazily per process: threads do not survive gunicorn's fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._smtp = None
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self.run_forever, name='lead-outbox', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                while self.process_batch():
+                    pass
+            except Exception:
+                logger.exception('Outbox batch failed')
+            idle = self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if not idle and self._smtp is not None:
+                # nothing happened for a full interval; don't hold the connection open
+                self._smtp.close()
+
+    def _claim(self, s, lead_id, seen_next_attempt, now):
+        lease = now + datetime.timedelta(seconds=self.LEASE_SECONDS)
+        res = s.execute(
+            update(Lead)
+            .where(Lead.id == lead_id, Lead.emailed.is_(False), Lead.next_attempt_at == seen_next_attempt)
+            .values(next_attempt_at=lease)
+        )
+        s.commit()
+        return res.rowcount == 1
+
+    def _record_sent(self, s, lead_id, emailed_at):
+        """Mark a delivered lead as sent; on failure keep it in _unrecorded for the next batch."""
+        try:
+            s.execute(
+                update(Lead).where(Lead.id == lead_id)
+                .values(emailed=True, emailed_at=emailed_at, error=None, next_attempt_at=None,
+                        attempts=func.coalesce(Lead.attempts, 0) + 1)
+            )
+            s.commit()
+            self._unrecorded.pop(lead_id, None)
+            return True
+        except Exception:
+            s.rollback()
+            if lead_id not in self._unrecorded:
+                logger.error(f'Email for lead id={lead_id} was delivered but could not be marked sent; '
+                             f'retrying before its lease expires', exc_info=True)
+            self._unrecorded[lead_id] = emailed_at
+            return False
+
+    def process_batch(self):
+        """Deliver due leads. Returns the number of leads handled (0 when idle)."""
+        settings = smtp_settings()
+        if not settings:
+            # leave leads queued until SMTP is configured
+            return 0
+        if self._smtp is None or self._smtp.settings != settings:
+            if self._smtp is not None:
+                self._smtp.close()
+            self._smtp = SmtpSession(settings)
+
+        s = SessionLocal()
+        handled = 0
+        try:
+            for lead_id, emailed_at in list(self._unrecorded.items()):
+                self._record_sent(s, lead_id, emailed_at)
+            now = datetime.datetime.utcnow()
+            due = (
+                s.query(Lead.id, Lead.next_attempt_at)
+                .filter(Lead.emailed.is_(False), Lead.next_attempt_at.isnot(None), Lead.next_attempt_at <= now)
+                .order_by(Lead.next_attempt_at, Lead.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            for lead_id, seen in due:
+                if self._stop.is_set():
+                    break
+                if lead_id in self._unrecorded or not self._claim(s, lead_id, seen, now):
+                    continue
+                lead = s.get(Lead, lead_id)
+                handled += 1
+                try:
+                    send_contact_email_from_lead(lead, smtp=self._smtp)
+                except Exception as e:
+                    attempts = (lead.attempts or 0) + 1
+                    lead.attempts = attempts
+                    lead.error = str(e)
+                    self.failed += 1
+                    if attempts >= self.max_attempts:
+                        # dead-lettered: stays visible in admin for manual resend
+                        lead.next_attempt_at = None
+                        logger.error(f'Giving up on lead id={lead.id} after {attempts} attempts: {e}')
+                    else:
+                        delay = self.backoff(attempts)
+                        lead.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+                        logger.warning(f'Email for lead id={lead.id} failed (attempt {attempts}), retry in {delay}s: {e}')
+                    self._smtp.close()
+                    s.commit()
+                    continue
+                self.sent += 1
+                logger.info(f'Contact email sent for lead id={lead_id}')
+                # the message is out: record it right away, separately from any other change
+                self._record_sent(s, lead_id, datetime.datetime.utcnow())
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+        return handled
+
+    def stats(self):
+        return {'sent': self.sent, 'failed': self.failed, 'unrecorded': len(self._unrecorded),
+                'running': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()}
+
+
+def from_env():
+    return OutboxWorker(
+        poll_interval=_env_int('OUTBOX_POLL_INTERVAL', 10),
+        max_attempts=max(1, _env_int('OUTBOX_MAX_ATTEMPTS', 8)),
+        backoff_base=_env_int('OUTBOX_BACKOFF_BASE', 30),
+        backoff_max=_env_int('OUTBOX_BACKOFF_MAX', 3600),
+    )
@@ -0,0 +1,229 @@
+"""Online maintenance of the leads SQLite database.
+
+Every job is written so the app keeps serving while it runs:
+
+* ``backup``: hot copy through the sqlite3 online backup API. In WAL mode
+  (the default profile) the whole copy is one step under a read snapshot,
+  which never blocks writers; a stepped copy would start over from page 0
+  after every commit of another connection, and the app commits page-view
+  counts every few seconds. With a rollback journal it copies a few hundred
+  pages per step with a short sleep in between, so writers only ever wait
+  for one step, and falls back to a single step after BACKUP_MAX_RESTARTS
+  restarts. The copy is written to a temp file and renamed when complete;
+  only the newest BACKUP_KEEP copies are kept.
+* ``purge_leads``: retention. Leads older than the cutoff are deleted in small
+  batches (one short write transaction each, with a pause between batches)
+  after being appended to a gzip NDJSON archive.
+* ``incremental_vacuum``: hands free pages back to the filesystem in steps.
+  Needs ``auto_vacuum=INCREMENTAL``; new databases get it from models.py,
+  existing ones need a one-off ``enable_incremental_vacuum()`` (a full VACUUM).
+
+Run from scripts/maintenance.py (cron / kubectl exec).
+
+Configuration (environment):
+  BACKUP_DIR              where backups are written (default data/backups)
+  BACKUP_KEEP             number of backups to keep (default 7)
+  BACKUP_MAX_RESTARTS     stepped (rollback-journal) backups restarted by writes before
+                          copying in one step (default 3)
+  ARCHIVE_DIR             where purged rows are archived (default data/archive)
+  LEAD_RETENTION_DAYS     purge leads older than this (default 0 = keep forever)
+  MAINT_BATCH_SIZE        rows per delete batch (default 500)
+  MAINT_BATCH_PAUSE_MS    pause between batches / backup steps (default 50)
+"""
+import os
+import time
+import glob
+import sqlite3
+import logging
+import datetime
+
+from sqlalchemy import select, delete, func
+
+import export
+from models import engine, SessionLocal, Lead, DB_PATH, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(DATA_DIR, 'backups'))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(DATA_DIR, 'archive'))
+BACKUP_KEEP = _env_int('BACKUP_KEEP', 7)
+BACKUP_MAX_RESTARTS = _env_int('BACKUP_MAX_RESTARTS', 3)
+LEAD_RETENTION_DAYS = _env_int('LEAD_RETENTION_DAYS', 0)
+BATCH_SIZE = _env_int('MAINT_BATCH_SIZE', 500)
+BATCH_PAUSE = _env_int('MAINT_BATCH_PAUSE_MS', 50) / 1000.0
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def backup(dest_dir=None, pages=256, pause=None, keep=None, max_restarts=None):
+    """Hot backup of the live DB. Returns the backup path.
+
+    ``pages``, ``pause`` and ``max_restarts`` only apply to a rollback-journal
+    DB; a WAL DB is copied in one step (see the module docstring).
+    """
+    dest_dir = dest_dir or BACKUP_DIR
+    pause = BATCH_PAUSE if pause is None else pause
+    keep = BACKUP_KEEP if keep is None else keep
+    max_restarts = BACKUP_MAX_RESTARTS if max_restarts is None else max_restarts
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    dest = os.path.join(dest_dir, f'leads.{stamp}.db')
+    tmp = dest + '.tmp'
+    started = time.monotonic()
+    last_remaining = None
+    restarts = 0
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining, restarts
+        logger.debug(f'backup: {total - remaining}/{total} pages')
+        # a write by another connection between steps restarts the copy from page 0
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts >= max_restarts:
+                raise _BackupRestarted()
+        last_remaining = remaining
+        # runs between steps, after the step's read lock is released; the sleep= argument
+        # below only applies when a step hits SQLITE_BUSY/LOCKED
+        if remaining and pause:
+            time.sleep(pause)
+
+    src = sqlite3.connect(DB_PATH, timeout=30)
+    dst = sqlite3.connect(tmp)
+    try:
+        if src.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+            # one step under a read snapshot: writers keep appending to the WAL meanwhile
+            src.backup(dst, pages=-1)
+        else:
+            try:
+                src.backup(dst, pages=pages, progress=progress, sleep=pause)
+            except _BackupRestarted:
+                logger.warning(f'backup: restarted {restarts} times by concurrent writes, copying in one step')
+                src.backup(dst, pages=-1)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, dest)
+    logger.info(f'Backup written to {dest} ({os.path.getsize(dest)} bytes, {time.monotonic() - started:.1f}s)')
+
+    if keep > 0:
+        for old in sorted(glob.glob(os.path.join(dest_dir, 'leads.*.db')))[:-keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return dest
+
+
+def purge_leads(older_than_days=None, before=None, batch_size=None, pause=None, archive=True):
+    """Delete leads created before the cutoff in batches, archiving them first.
+
+    ``before`` (datetime) wins over ``older_than_days``; with neither set, nothing
+    is purged. Returns (deleted, archive_path).
+    """
+    batch_size = batch_size or BATCH_SIZE
+    pause = BATCH_PAUSE if pause is None else pause
+    if before is None:
+        days = LEAD_RETENTION_DAYS if older_than_days is None else older_than_days
+        if not days or days <= 0:
+            return 0, None
+        before = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+
+    stmt, columns = export.build_select('leads', until=before.isoformat())
+    archive_path = None
+    if archive:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        archive_path = os.path.join(ARCHIVE_DIR, f'leads.{datetime.datetime.utcnow():%Y%m%d_%H%M%S}.ndjson.gz')
+
+    deleted = 0
+    last_id = 0
+    while True:
+        s = SessionLocal()
+        try:
+            rows = s.execute(stmt.where(Lead.id > last_id).limit(batch_size)).all()
+            if not rows:
+                break
+            if archive_path:
+                # appending gzip members keeps the file a valid gzip stream; written before the delete commits
+                with open(archive_path, 'ab') as f:
+                    for chunk in export.gzip_chunks(export.encode_ndjson(rows, columns)):
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+            ids = [r.id for r in rows]
+            s.execute(delete(Lead).where(Lead.id.in_(ids)))
+            s.commit()
+            deleted += len(ids)
+            last_id = ids[-1]
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+        # let web workers take the write lock between batches
+        time.sleep(pause)
+    if deleted:
+        logger.info(f'Purged {deleted} leads created before {before:%Y-%m-%d %H:%M}'
+                    + (f', archived to {archive_path}' if archive_path else ''))
+    return deleted, archive_path if deleted else None
+
+
+def auto_vacuum_mode():
+    with engine.connect() as conn:
+        return {0: 'none', 1: 'full', 2: 'incremental'}.get(conn.exec_driver_sql('PRAGMA auto_vacuum').scalar())
+
+
+def enable_incremental_vacuum():
+    """One-off switch of an existing DB to auto_vacuum=INCREMENTAL. Runs a full VACUUM (locks the DB)."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.exec_driver_sql('VACUUM')
+    return auto_vacuum_mode()
+
+
+def incremental_vacuum(step_pages=256, max_pages=None, pause=None):
+    """Release free pages in steps of ``step_pages``. Returns pages freed (0 if not in incremental mode)."""
+    pause = BATCH_PAUSE if pause is None else pause
+    if auto_vacuum_mode() != 'incremental':
+        logger.warning('incremental_vacuum skipped: auto_vacuum is not INCREMENTAL')
+        return 0
+    freed = 0
+    while max_pages is None or freed < max_pages:
+        with engine.begin() as conn:
+            free = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+            if not free:
+                break
+            n = min(step_pages, free) if max_pages is None else min(step_pages, free, max_pages - freed)
+            # the pragma frees one page per step: drain the raw cursor so all n are released
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(f'PRAGMA incremental_vacuum({n})').fetchall()
+            finally:
+                cursor.close()
+            freed += free - conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+        time.sleep(pause)
+    if freed:
+        logger.info(f'incremental_vacuum released {freed} pages')
+    return freed
+
+
+def db_stats():
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql('PRAGMA page_size').scalar()
+        return {
+            'path': DB_PATH,
+            'pages': conn.exec_driver_sql('PRAGMA page_count').scalar(),
+            'free_pages': conn.exec_driver_sql('PRAGMA freelist_count').scalar(),
+            'page_size': page_size,
+            'auto_vacuum': auto_vacuum_mode(),
+            'leads': conn.execute(select(func.count(Lead.id))).scalar(),
+        }
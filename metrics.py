@@ -0,0 +1,176 @@
+"""Prometheus metrics: request latency, in-flight requests, SQL, templates and outbound calls.
+
+Exposed at /metrics. Under gunicorn every worker is a separate process, so
+set PROMETHEUS_MULTIPROC_DIR to an empty, writable directory: each worker then
+writes its samples to mmap'd files there and /metrics aggregates all of them,
+whichever worker answers the scrape. gunicorn.conf.py wipes the directory on
+startup and marks dead workers. Without the variable, metrics are per process
+(fine for the dev server).
+
+``prometheus_client`` is optional; when it is missing every helper here is a
+no-op and /metrics answers 404.
+
+Metrics:
+  http_request_duration_seconds{route,method,status}   histogram
+  http_requests_in_progress{route}                      gauge (summed over workers)
+  db_query_duration_seconds{operation}                  histogram (SQLAlchemy cursor time)
+  template_render_duration_seconds{template}            histogram
+  dependency_duration_seconds{dependency,outcome}       histogram (ipapi, github, smtp, geoip;
+                                                        outcome ok | error | open = circuit open)
+  rate_limit_rejections_total{route}                    counter
+
+Configuration (environment):
+  PROMETHEUS_MULTIPROC_DIR  shared directory for multi-process mode (gunicorn)
+  METRICS_TOKEN             if set, /metrics requires "Authorization: Bearer <token>"
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+except Exception:
+    prometheus_client = None
+
+ENABLED = prometheus_client is not None
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+if ENABLED:
+    REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency',
+                                ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+    IN_PROGRESS = Gauge('http_requests_in_progress', 'Requests being handled',
+                        ['route'], multiprocess_mode='livesum')
+    DB_LATENCY = Histogram('db_query_duration_seconds', 'SQL statement execution time',
+                           ['operation'], buckets=FAST_BUCKETS)
+    TEMPLATE_LATENCY = Histogram('template_render_duration_seconds', 'Jinja template render time',
+                                 ['template'], buckets=FAST_BUCKETS)
+    DEPENDENCY_LATENCY = Histogram('dependency_duration_seconds', 'Outbound/dependency call time',
+                                   ['dependency', 'outcome'], buckets=LATENCY_BUCKETS)
+    RATE_LIMITED = Counter('rate_limit_rejections_total', 'Requests rejected by the rate limiter', ['route'])
+
+_local = threading.local()
+
+
+class _Outcome:
+    __slots__ = ('outcome',)
+
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+@contextmanager
+def track(dependency):
+    """Time a dependency call; exceptions count as outcome="error" (or set ``t.outcome`` yourself)."""
+    t = _Outcome()
+    start = time.perf_counter()
+    try:
+        yield t
+    except BaseException:
+        t.outcome = 'error'
+        raise
+    finally:
+        if ENABLED:
+            DEPENDENCY_LATENCY.labels(dependency, t.outcome).observe(time.perf_counter() - start)
+
+
+def _route():
+    from flask import request
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def init_app(app):
+    """Register request hooks and template signals. /metrics itself is added by the app."""
+    if not ENABLED:
+        return
+    from flask import request, g, before_render_template, template_rendered
+
+    def _metrics_start():
+        if request.path == '/metrics':
+            return
+        g._metrics_start = time.perf_counter()
+        g._metrics_route = _route()
+        IN_PROGRESS.labels(g._metrics_route).inc()
+
+    # first before_request hook, so requests the rate limiter rejects are timed too
+    app.before_request_funcs.setdefault(None, []).insert(0, _metrics_start)
+
+    @app.teardown_request
+    def _metrics_end(exc=None):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        route = g.pop('_metrics_route')
+        IN_PROGRESS.labels(route).dec()
+        status = g.pop('_metrics_status', 500 if exc is not None else 200)
+        REQUEST_LATENCY.labels(route, request.method, str(status)).observe(time.perf_counter() - start)
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        if response.status_code == 429:
+            RATE_LIMITED.labels(getattr(g, '_metrics_route', None) or _route()).inc()
+        return response
+
+    def _template_start(sender, template, context, **extra):
+        stack = getattr(_local, 'templates', None)
+        if stack is None:
+            stack = _local.templates = []
+        stack.append(time.perf_counter())
+
+    def _template_done(sender, template, context, **extra):
+        stack = getattr(_local, 'templates', None)
+        if stack:
+            TEMPLATE_LATENCY.labels(template.name or 'inline').observe(time.perf_counter() - stack.pop())
+
+    before_render_template.connect(_template_start, app, weak=False)
+    template_rendered.connect(_template_done, app, weak=False)
+
+
+def instrument_engine(engine):
+    """Record SQL execution time per statement type through SQLAlchemy cursor events."""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_t0', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('_metrics_t0')
+        if not stack:
+            return
+        op = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        if op not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'PRAGMA', 'WITH'):
+            op = 'OTHER'
+        DB_LATENCY.labels(op).observe(time.perf_counter() - stack.pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get('_metrics_t0'):
+            conn.info['_metrics_t0'].pop()
+
+
+def render():
+    """Return (body, content_type) for a scrape; aggregates all workers in multi-process mode."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """gunicorn child_exit hook: drop a dead worker's live gauges."""
+    if ENABLED and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
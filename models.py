@@ -1,8 +1,12 @@
 import os
 import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import (create_engine, event, select, update, or_, func,
+                        Column, Integer, String, Boolean, DateTime, Text, LargeBinary)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+import hll
+
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -10,8 +14,77 @@ DB_PATH = os.environ.get('LEADS_DB', os.path.join(DATA_DIR, 'leads.db'))
 
 DATABASE_URL = f'sqlite:///{DB_PATH}'
 
-# For sqlite + SQLAlchemy in multi-threaded webserver, disable same_thread check
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# SQLite performance profile, applied on every new connection.
+# SQLITE_PROFILE=wal (default) enables WAL so readers never block the writer and
+# concurrent gunicorn workers wait on busy_timeout instead of failing with
+# "database is locked". SQLITE_PROFILE=legacy keeps SQLite defaults (rollback journal).
+# WAL needs all writers on the same host (shared memory): fine for a RWO PVC, not for NFS.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'wal').lower()
+SQLITE_PRAGMAS = {
+    # only takes effect on a new (empty) DB, so it must come before journal_mode;
+    # existing DBs are switched once with maintenance.enable_incremental_vacuum()
+    'auto_vacuum': os.environ.get('SQLITE_AUTO_VACUUM', 'INCREMENTAL'),
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+    'mmap_size': _env_int('SQLITE_MMAP_SIZE', 64 * 1024 * 1024),
+    # negative value = size in KiB
+    'cache_size': _env_int('SQLITE_CACHE_SIZE', -16000),
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+# For sqlite + SQLAlchemy in multi-threaded webserver, disable same_thread check.
+# Each gunicorn worker has its own pool and serves up to GUNICORN_THREADS requests at
+# once, plus the outbox / page-stats threads: by default the overflow lets every one of
+# them hold a connection instead of waiting DB_POOL_TIMEOUT and failing. SQLite
+# connections are cheap, and overflow ones are only opened under load.
+_POOL_SIZE = _env_int('DB_POOL_SIZE', 5)
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": SQLITE_PRAGMAS['busy_timeout'] / 1000.0},
+    pool_size=_POOL_SIZE,
+    max_overflow=_env_int('DB_MAX_OVERFLOW', max(5, _env_int('GUNICORN_THREADS', 32) + 4 - _POOL_SIZE)),
+    pool_timeout=_env_int('DB_POOL_TIMEOUT', 10),
+    pool_pre_ping=os.environ.get('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no'),
+)
+
+
+@event.listens_for(engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_conn, connection_record):
+    if SQLITE_PROFILE == 'legacy':
+        return
+    cursor = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+@event.listens_for(engine, 'connect')
+def _register_sqlite_functions(dbapi_conn, connection_record):
+    # hll_merge(a, b): lets the page_visitors upsert merge sketches inside SQLite (pagestats.py)
+    dbapi_conn.create_function('hll_merge', 2, hll.merge_bytes, deterministic=True)
+
+
+def dispose_engine_after_fork():
+    """Drop pooled connections inherited from the parent (gunicorn --preload).
+    close=False leaves the parent's sqlite handles alone; the child opens fresh ones.
+    """
+    engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispose_engine_after_fork)
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
@@ -26,6 +99,9 @@ class Lead(Base):
     emailed = Column(Boolean, default=False)
     emailed_at = Column(DateTime, nullable=True)
     error = Column(Text, nullable=True)
+    # outbox state: next_attempt_at is set while the lead is queued for delivery
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True, index=True)
 
 
 class PageView(Base):
@@ -46,5 +122,115 @@ class AccessLocation(Base):
     last_seen = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 
+class PageVisitors(Base):
+    """HyperLogLog sketch of the distinct visitors (salted IP + User-Agent hashes) of a path on a UTC day."""
+    __tablename__ = 'page_visitors'
+    path = Column(String(500), primary_key=True)
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    sketch = Column(LargeBinary)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class IpGeoCache(Base):
+    """Persistent IP -> country answers shared by all workers ('' = negative entry)."""
+    __tablename__ = 'ip_geo_cache'
+    ip = Column(String(45), primary_key=True)
+    country = Column(String(8), default='')
+    resolved_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class JobCheckpoint(Base):
+    """Progress of resumable maintenance jobs (e.g. last lead id scanned by backfill_locations)."""
+    __tablename__ = 'job_checkpoints'
+    name = Column(String(100), primary_key=True)
+    position = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+# columns added after the first release; create_all() does not alter existing tables
+_ADDED_COLUMNS = {
+    'leads': [
+        ('attempts', 'INTEGER DEFAULT 0'),
+        ('next_attempt_at', 'DATETIME'),
+    ],
+}
+
+
+def _add_missing_columns():
+    with engine.begin() as conn:
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info({table})')}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}')
+        conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_leads_next_attempt_at ON leads (next_attempt_at)')
+
+
+_LEGACY_QUEUE_MARKER = 'outbox_legacy_queue'
+
+
+def _queue_legacy_leads():
+    """Queue unsent leads from before the outbox once: they have next_attempt_at NULL, which the
+    outbox never selects. Leads the outbox has already tried (attempts > 0) are left alone.
+    """
+    with engine.begin() as conn:
+        if conn.execute(select(JobCheckpoint.name).where(JobCheckpoint.name == _LEGACY_QUEUE_MARKER)).first():
+            return
+        now = datetime.datetime.utcnow()
+        queued = conn.execute(
+            update(Lead)
+            .where(or_(Lead.emailed.is_(False), Lead.emailed.is_(None)), Lead.next_attempt_at.is_(None),
+                   func.coalesce(Lead.attempts, 0) == 0)
+            .values(next_attempt_at=now)
+        ).rowcount
+        conn.execute(sqlite_insert(JobCheckpoint).values(name=_LEGACY_QUEUE_MARKER, position=queued, updated_at=now)
+                     .on_conflict_do_nothing(index_elements=['name']))
+
+
+# Full-text index over leads (external content: the text lives only in `leads`,
+# leads_fts holds the index). Triggers keep it in sync with every insert/update/delete.
+LEADS_FTS = False
+
+_LEADS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5("
+    "name, email, message, content='leads', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN "
+    "INSERT INTO leads_fts(rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN "
+    "INSERT INTO leads_fts(leads_fts, rowid, name, email, message) "
+    "VALUES ('delete', old.id, old.name, old.email, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE OF name, email, message ON leads BEGIN "
+    "INSERT INTO leads_fts(leads_fts, rowid, name, email, message) "
+    "VALUES ('delete', old.id, old.name, old.email, old.message); "
+    "INSERT INTO leads_fts(rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message); END",
+]
+
+
+def _create_leads_fts():
+    """Create leads_fts + triggers; index existing rows the first time. False if FTS5 is unavailable."""
+    try:
+        with engine.begin() as conn:
+            existed = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='leads_fts'").first() is not None
+            for ddl in _LEADS_FTS_DDL:
+                conn.exec_driver_sql(ddl)
+            if not existed:
+                conn.exec_driver_sql("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')")
+        return True
+    except Exception:
+        # sqlite3 built without FTS5: admin search falls back to LIKE on name/email
+        return False
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 MATCH expression: every word as a quoted prefix term."""
+    terms = [t.replace('"', '""') for t in text.split()]
+    return ' '.join(f'"{t}"*' for t in terms if t)
+
+
 def init_db():
+    global LEADS_FTS
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _queue_legacy_leads()
+    LEADS_FTS = _create_leads_fts()
@@ -0,0 +1,132 @@
+"""In-memory cache of rendered pages keyed by (endpoint, lang, is_admin).
+
+The public pages only vary by language and admin state, so the rendered body
+is kept per key with a strong ETag (hash of the body). Repeat visitors
+revalidate with If-None-Match and get a 304; everyone else is served the
+stored bytes without running Jinja.
+
+Entries are dropped when any file under templates/ changes (mtime checked at
+most every ``check_interval`` seconds) and, naturally, on deploy/restart. The
+build id (APP_BUILD_ID / GIT_SHA env) is mixed into the ETag so browsers don't
+reuse a 304 across deploys.
+
+Configuration (environment):
+  PAGE_CACHE               0 to disable (default 1)
+  PAGE_CACHE_CHECK_INTERVAL  seconds between template mtime checks (default 2)
+"""
+import os
+import time
+import hashlib
+import threading
+from functools import wraps
+
+from flask import request, make_response
+
+
+class PageCache:
+
+    def __init__(self, key_func, templates_dir, check_interval=2.0, enabled=True, build_id=''):
+        self.key_func = key_func
+        self.templates_dir = templates_dir
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self.build_id = build_id
+        self._entries = {}  # key -> (body, etag, mimetype)
+        self._lock = threading.Lock()
+        self._templates_mtime = None
+        self._next_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _templates_changed(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        latest = 0
+        try:
+            with os.scandir(self.templates_dir) as it:
+                for entry in it:
+                    latest = max(latest, entry.stat().st_mtime_ns)
+        except OSError:
+            return False
+        changed = self._templates_mtime is not None and latest != self._templates_mtime
+        self._templates_mtime = latest
+        return changed
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _client_tag(etag):
+        """The client's If-None-Match tag for this body, or None.
+        compression.py suffixes the ETag with the content encoding ("<etag>-gzip").
+        """
+        for tag in request.if_none_match.as_set():
+            if tag == etag or tag.startswith(etag + '-'):
+                return tag
+        return None
+
+    def _respond(self, body, etag, mimetype):
+        tag = self._client_tag(etag)
+        if tag is not None:
+            self.not_modified += 1
+            resp = make_response('', 304)
+            # the tag the client got with its 200, encoding suffix included
+            # (compression.py adds the matching Vary: Accept-Encoding)
+            resp.set_etag(tag)
+        else:
+            resp = make_response(body)
+            resp.mimetype = mimetype
+            resp.set_etag(etag)
+        # per-user variation (language / admin session) => must not be shared by proxies
+        resp.headers['Cache-Control'] = 'private, no-cache'
+        resp.vary.add('Accept-Language')
+        resp.vary.add('Cookie')
+        return resp
+
+    def cached(self, view):
+        """Decorator for GET views whose output depends only on key_func()."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            if self._templates_changed():
+                self.invalidate()
+            key = (request.endpoint,) + tuple(self.key_func())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return self._respond(*entry)
+
+            self.misses += 1
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.direct_passthrough:
+                return resp
+            body = resp.get_data()
+            etag = hashlib.sha1(self.build_id.encode() + body).hexdigest()[:20]
+            entry = (body, etag, resp.mimetype)
+            with self._lock:
+                self._entries[key] = entry
+            return self._respond(*entry)
+        return wrapper
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'not_modified': self.not_modified}
+
+
+def from_env(key_func, templates_dir):
+    try:
+        interval = float(os.environ.get('PAGE_CACHE_CHECK_INTERVAL', 2))
+    except ValueError:
+        interval = 2.0
+    return PageCache(
+        key_func,
+        templates_dir,
+        check_interval=interval,
+        enabled=os.environ.get('PAGE_CACHE', '1').lower() not in ('0', 'false', 'no'),
+        build_id=os.environ.get('APP_BUILD_ID') or os.environ.get('GIT_SHA') or '',
+    )
@@ -0,0 +1,224 @@
+"""Write-behind aggregation of PageView / AccessLocation counters.
+
+``track_page_view`` used to run a SELECT + UPDATE for each table and commit on
+every hit. Instead each worker accumulates count deltas and the latest
+last_seen per key in memory and flushes them in one transaction every
+``interval`` seconds or ``max_hits`` hits, and on worker exit. The flush uses
+SQL-side ``count = count + delta`` upserts, so concurrent flushes from several
+gunicorn workers (or replicas) never overwrite each other's increments.
+
+Unique visitors: each hit also adds a salted hash of client IP + User-Agent to
+a HyperLogLog sketch (hll.py, 4 KB) per path and UTC day. The flush merges
+the buffered sketch into the stored page_visitors BLOB inside SQLite
+(``hll_merge``), so workers and replicas combine without double counting and
+the table grows by one fixed-size row per path per day, whatever the traffic.
+A crawler refreshing / raises the hit count but stays one visitor.
+
+Configuration (environment):
+  PAGEVIEW_FLUSH_INTERVAL  seconds between flushes (default 5; 0 = flush every hit)
+  PAGEVIEW_FLUSH_HITS      flush early once this many hits are buffered (default 100)
+  VISITOR_HASH_SALT        key for the visitor hashes (default SECRET_KEY)
+"""
+import os
+import atexit
+import logging
+import datetime
+import threading
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import hll
+from models import SessionLocal, PageView, AccessLocation, PageVisitors
+
+logger = logging.getLogger(__name__)
+
+
+def upsert_count(model, key_col, key, delta, first_seen, last_seen):
+    """INSERT .. ON CONFLICT statement adding ``delta`` to ``model.count`` for ``key``."""
+    stmt = sqlite_insert(model).values(**{key_col: key}, count=delta, first_seen=first_seen, last_seen=last_seen)
+    return stmt.on_conflict_do_update(
+        index_elements=[key_col],
+        set_={
+            'count': func.coalesce(model.count, 0) + stmt.excluded.count,
+            'last_seen': func.max(func.coalesce(model.last_seen, stmt.excluded.last_seen), stmt.excluded.last_seen),
+        },
+    )
+
+
+def upsert_sketch(path, day, sketch, now):
+    """INSERT .. ON CONFLICT statement merging ``sketch`` into the stored visitors sketch of ``path`` on ``day``."""
+    stmt = sqlite_insert(PageVisitors).values(path=path, day=day, sketch=sketch, updated_at=now)
+    return stmt.on_conflict_do_update(
+        index_elements=['path', 'day'],
+        set_={
+            'sketch': func.hll_merge(PageVisitors.sketch, stmt.excluded.sketch, type_=PageVisitors.sketch.type),
+            'updated_at': now,
+        },
+    )
+
+
+def unique_visitors(session, paths, today=None, days=7):
+    """{path: (visitors today, visitors over the last ``days`` days)} from the stored sketches."""
+    today = today or datetime.datetime.utcnow().date()
+    since = (today - datetime.timedelta(days=days - 1)).isoformat()
+    rows = session.query(PageVisitors.path, PageVisitors.day, PageVisitors.sketch).filter(
+        PageVisitors.path.in_(list(paths)), PageVisitors.day >= since).all()
+    daily, window = {}, {}
+    for path, day, sketch in rows:
+        if not sketch:
+            continue
+        if day == today.isoformat():
+            daily[path] = hll.HyperLogLog.from_bytes(sketch).count()
+        window.setdefault(path, hll.HyperLogLog()).merge(sketch)
+    return {path: (daily.get(path, 0), sketch.count()) for path, sketch in window.items()}
+
+
+class CounterBuffer:
+
+    def __init__(self, interval=5.0, max_hits=100, salt=b''):
+        self.interval = interval
+        self.max_hits = max_hits
+        self.salt = salt
+        self._pages = {}      # path -> [delta, first_seen, last_seen]
+        self._countries = {}  # country -> [delta, first_seen, last_seen]
+        self._visitors = {}   # (path, day) -> HyperLogLog
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flushes = 0
+        self.flush_errors = 0
+
+    @staticmethod
+    def _bump(bucket, key, delta, first_seen, last_seen):
+        entry = bucket.get(key)
+        if entry is None:
+            bucket[key] = [delta, first_seen, last_seen]
+        else:
+            entry[0] += delta
+            if first_seen < entry[1]:
+                entry[1] = first_seen
+            if last_seen > entry[2]:
+                entry[2] = last_seen
+
+    def record(self, path, country=None, now=None, visitor=None):
+        """Buffer one hit for ``path`` (and ``country`` when known); ``visitor`` (e.g. IP + UA) feeds the sketch."""
+        now = now or datetime.datetime.utcnow()
+        h = hll.hash64(visitor, self.salt) if visitor else None
+        self._ensure_flusher()
+        with self._lock:
+            self._bump(self._pages, path, 1, now, now)
+            if country:
+                self._bump(self._countries, country, 1, now, now)
+            if h is not None:
+                key = (path, now.strftime('%Y-%m-%d'))
+                sketch = self._visitors.get(key)
+                if sketch is None:
+                    sketch = self._visitors[key] = hll.HyperLogLog()
+                sketch.add_hash(h)
+            self._pending += 1
+            full = self._pending >= self.max_hits
+        if self.interval <= 0:
+            self.flush()
+        elif full:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        # started lazily per process: threads do not survive gunicorn's fork
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='pageview-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Page view flush failed')
+
+    def _swap(self):
+        with self._lock:
+            pages, countries, visitors = self._pages, self._countries, self._visitors
+            self._pages, self._countries, self._visitors = {}, {}, {}
+            self._pending = 0
+        return pages, countries, visitors
+
+    def _restore(self, pages, countries, visitors):
+        # put deltas back so a failed flush loses nothing; retried on the next tick
+        with self._lock:
+            for key, (delta, first, last) in pages.items():
+                self._bump(self._pages, key, delta, first, last)
+                self._pending += delta
+            for key, (delta, first, last) in countries.items():
+                self._bump(self._countries, key, delta, first, last)
+            for key, sketch in visitors.items():
+                current = self._visitors.get(key)
+                self._visitors[key] = sketch if current is None else current.merge(sketch)
+
+    def flush(self):
+        """Write buffered deltas in a single transaction. Returns number of hits flushed."""
+        with self._flush_lock:
+            pages, countries, visitors = self._swap()
+            if not pages and not countries and not visitors:
+                return 0
+            now = datetime.datetime.utcnow()
+            s = SessionLocal()
+            try:
+                for path, (delta, first, last) in pages.items():
+                    s.execute(upsert_count(PageView, 'path', path, delta, first, last))
+                for country, (delta, first, last) in countries.items():
+                    s.execute(upsert_count(AccessLocation, 'country', country, delta, first, last))
+                for (path, day), sketch in visitors.items():
+                    s.execute(upsert_sketch(path, day, sketch.to_bytes(), now))
+                s.commit()
+                self.flushes += 1
+                return sum(v[0] for v in pages.values())
+            except Exception:
+                self.flush_errors += 1
+                try:
+                    s.rollback()
+                except Exception:
+                    pass
+                self._restore(pages, countries, visitors)
+                raise
+            finally:
+                s.close()
+
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Page view flush failed')
+
+    def stats(self):
+        with self._lock:
+            return {'pending_hits': self._pending, 'pages': len(self._pages), 'countries': len(self._countries),
+                    'visitor_sketches': len(self._visitors), 'flushes': self.flushes,
+                    'flush_errors': self.flush_errors}
+
+
+def from_env():
+    try:
+        interval = float(os.environ.get('PAGEVIEW_FLUSH_INTERVAL', 5))
+    except ValueError:
+        interval = 5.0
+    try:
+        max_hits = int(os.environ.get('PAGEVIEW_FLUSH_HITS', 100))
+    except ValueError:
+        max_hits = 100
+    salt = os.environ.get('VISITOR_HASH_SALT') or os.environ.get('SECRET_KEY', 'dev-secret')
+    buf = CounterBuffer(interval=interval, max_hits=max(1, max_hits), salt=salt.encode('utf-8'))
+    # flush on interpreter / gunicorn worker exit
+    atexit.register(buf.flush_quietly)
+    return buf
@@ -0,0 +1,199 @@
+"""Opt-in per-request profiling, stored under log/profiles/ and listed at /admin/profiles.
+
+A request is profiled when profiling is enabled (PROFILING=1) and either
+  * the caller is a logged-in admin and sends ``X-Profile: 1`` or ``?__profile=1``, or
+  * it is picked by sampling (PROFILE_SAMPLE_RATE=N profiles about 1 in N requests).
+
+The request runs under cProfile (top functions by cumulative time) while a
+sampler thread records the request thread's stack every PROFILE_INTERVAL_MS;
+the samples are written as collapsed stacks ("a;b;c count"), which
+flamegraph.pl, speedscope and inferno read directly. Each profile is three
+files sharing a name: .json (metadata), .txt (pstats report), .collapsed.
+
+With PROFILING unset no hook is registered at all, so disabled profiling
+costs nothing per request.
+
+Configuration (environment):
+  PROFILING              1 to register the hook (default 0)
+  PROFILE_SAMPLE_RATE    profile ~1 in N requests (default 0 = only on demand)
+  PROFILE_PATHS          comma-separated path prefixes eligible for sampling (default: all)
+  PROFILE_INTERVAL_MS    stack sampling interval (default 2)
+  PROFILE_KEEP           profiles kept on disk (default 50)
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import pstats
+import cProfile
+import logging
+import datetime
+import threading
+
+logger = logging.getLogger(__name__)
+
+_NAME_RE = re.compile(r'^[0-9]{8}T[0-9]{9}_[0-9a-f]{6}_[A-Za-z0-9_.-]+$')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True, name='profile-sampler')
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        while not self._stop_evt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            key = ';'.join(reversed(names))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        self._stop_evt.set()
+        self.join(timeout=1.0)
+
+    def collapsed(self):
+        return ''.join(f'{stack} {n}\n' for stack, n in sorted(self.counts.items()))
+
+
+class RequestProfiler:
+
+    def __init__(self, directory, sample_rate=0, paths=None, interval=0.002, keep=50):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.paths = tuple(paths or ())
+        self.interval = interval
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def _wanted(self, request, session):
+        if request.headers.get('X-Profile') == '1' or request.args.get('__profile') == '1':
+            return 'on-demand' if session.get('admin') else None
+        if self.sample_rate > 0 and random.randrange(self.sample_rate) == 0:
+            if not self.paths or request.path.startswith(self.paths):
+                return 'sampled'
+        return None
+
+    def init_app(self, app):
+        from flask import request, session, g
+
+        def _start():
+            trigger = self._wanted(request, session)
+            if trigger is None:
+                return
+            prof = cProfile.Profile()
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            g._profile = (prof, sampler, trigger, time.perf_counter())
+            sampler.start()
+            prof.enable()
+
+        # run first so the rest of the before_request chain is profiled too
+        app.before_request_funcs.setdefault(None, []).insert(0, _start)
+
+        @app.after_request
+        def _status(response):
+            if '_profile' in g:
+                g._profile_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def _finish(exc=None):
+            state = g.pop('_profile', None)
+            if state is None:
+                return
+            prof, sampler, trigger, started = state
+            prof.disable()
+            sampler.stop()
+            try:
+                self._save(prof, sampler, trigger, time.perf_counter() - started,
+                           request.method, request.path, request.endpoint, g.pop('_profile_status', 500))
+            except Exception:
+                logger.exception('Failed to save request profile')
+
+    def _save(self, prof, sampler, trigger, duration, method, path, endpoint, status):
+        os.makedirs(self.directory, exist_ok=True)
+        now = datetime.datetime.utcnow()
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', path.strip('/') or 'root')[:60]
+        name = f'{now:%Y%m%dT%H%M%S}{now.microsecond // 1000:03d}_{random.getrandbits(24):06x}_{slug}'
+        base = os.path.join(self.directory, name)
+
+        out = io.StringIO()
+        stats = pstats.Stats(prof, stream=out)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(40)
+        with open(base + '.txt', 'w') as f:
+            f.write(out.getvalue())
+        with open(base + '.collapsed', 'w') as f:
+            f.write(sampler.collapsed())
+        meta = {'name': name, 'created_at': now.isoformat(timespec='seconds'), 'method': method, 'path': path,
+                'endpoint': endpoint, 'status': status, 'duration_ms': round(duration * 1000, 2),
+                'trigger': trigger, 'samples': sum(sampler.counts.values()), 'pid': os.getpid()}
+        with open(base + '.json', 'w') as f:
+            json.dump(meta, f)
+        logger.info(f'Request profile saved: {method} {path} {meta["duration_ms"]} ms -> {name}')
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            metas = sorted(n for n in os.listdir(self.directory) if n.endswith('.json'))
+            for old in metas[:-self.keep] if self.keep > 0 else []:
+                for ext in ('.json', '.txt', '.collapsed'):
+                    try:
+                        os.remove(os.path.join(self.directory, old[:-5] + ext))
+                    except OSError:
+                        pass
+
+    def list(self, limit=100):
+        """Metadata of stored profiles, newest first."""
+        try:
+            names = sorted((n for n in os.listdir(self.directory) if n.endswith('.json')), reverse=True)
+        except OSError:
+            return []
+        out = []
+        for n in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, n)) as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def path_for(self, name, ext):
+        """Absolute path of a stored profile file, or None for unknown/malformed names."""
+        if ext not in ('txt', 'collapsed', 'json') or not _NAME_RE.match(name):
+            return None
+        full = os.path.join(self.directory, f'{name}.{ext}')
+        return full if os.path.isfile(full) else None
+
+
+def from_env(log_dir):
+    """Return a RequestProfiler, or None when PROFILING is off."""
+    if os.environ.get('PROFILING', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+    paths = [p.strip() for p in os.environ.get('PROFILE_PATHS', '').split(',') if p.strip()]
+    return RequestProfiler(
+        os.path.join(log_dir, 'profiles'),
+        sample_rate=_env_int('PROFILE_SAMPLE_RATE', 0),
+        paths=paths,
+        interval=_env_int('PROFILE_INTERVAL_MS', 2) / 1000.0,
+        keep=_env_int('PROFILE_KEEP', 50),
+    )
@@ -0,0 +1,282 @@
+"""Rate limit counters shared by all gunicorn workers of a pod through a memory-mapped file.
+
+Flask-Limiter's in-memory storage is per process: with N workers every limit
+is effectively N times higher and counters reset whenever a worker restarts.
+This storage (URI scheme ``shm://<path>``) keeps the counters in a fixed-size
+file, by default on tmpfs (/dev/shm), that every worker maps:
+
+* the file is a hash table of buckets with 8 slots each; a key hashes to one
+  bucket, so a check reads and writes one 320-byte region while holding one
+  lock (a per-process thread lock plus a fcntl byte-range lock on the bucket);
+* a slot holds the counts of the current and the previous window, and the
+  count reported to the limiter is the sliding-window estimate
+  ``current + previous * (part of the previous window still in range)``, so
+  Flask-Limiter's default fixed-window strategy behaves as a sliding window
+  (no double burst across a window boundary);
+* a slot whose windows are both over is simply reused, so keys expire without
+  any cleanup pass; a bucket full of live keys evicts the one closest to expiry.
+
+Counters survive worker restarts but not a pod restart, and each replica has
+its own file: for limits shared across replicas set REDIS_URL instead.
+
+Configuration (environment):
+  RATELIMIT_STORAGE   shm (default) or memory (per-process counters)
+  RATELIMIT_FILE      counter file (default /dev/shm/leads-ratelimit, else in the temp dir)
+  RATELIMIT_BUCKETS   hash buckets of 8 keys each (default 4096, ~1.3 MB)
+"""
+import os
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX: only the per-process memory storage is available
+    fcntl = None
+
+from limits.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'RLSHM001'
+_HEADER = struct.Struct('<8sQ')
+_HEADER_SIZE = 64
+# key hash, window index (time // period), period (s), current count, previous count
+_SLOT = struct.Struct('<Qqqqq')
+_SLOTS = 8
+_BUCKET = struct.Struct('<' + 'Qqqqq' * _SLOTS)
+_BUCKET_SIZE = _BUCKET.size
+_FIELDS = 5
+_LOCK_STRIPES = 64
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+_hashes = {}
+
+
+def _key_hash(key):
+    """Stable 64-bit key hash (never 0, which marks an empty slot); memoised, clients repeat keys."""
+    h = _hashes.get(key)
+    if h is None:
+        if len(_hashes) >= 50000:
+            _hashes.clear()
+        h = _hashes[key] = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(),
+                                          'little') | 1
+    return h
+
+
+class SharedMemoryStorage(Storage):
+    """limits storage backed by a mmap'd hash table; ``shm:///dev/shm/name``."""
+
+    STORAGE_SCHEME = ['shm']
+
+    def __init__(self, uri=None, buckets=None, **options):
+        self.path = urlparse(uri).path if uri else default_path()
+        self.buckets = int(buckets or _env_int('RATELIMIT_BUCKETS', 4096))
+        self._size = _HEADER_SIZE + self.buckets * _BUCKET_SIZE
+        self._pid = None
+        self._fd = None
+        self._mm = None
+        self._open_lock = threading.Lock()
+        super().__init__(uri, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError, struct.error)
+
+    # --- file handling -------------------------------------------------
+
+    def _map(self):
+        """The mapping for this process (re-opened after fork)."""
+        if self._pid == os.getpid():
+            return self._mm
+        with self._open_lock:
+            if self._pid != os.getpid():
+                self._open()
+        return self._mm
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # whole-file lock while checking/initialising the layout; workers start concurrently
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, _HEADER.size, 0)
+            if (os.fstat(fd).st_size != self._size or len(header) < _HEADER.size
+                    or _HEADER.unpack(header) != (_MAGIC, self.buckets)):
+                # new file or a different RATELIMIT_BUCKETS: start from empty counters
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self._size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, self.buckets), 0)
+                logger.info(f'Rate limit counters initialised in {self.path} ({self.buckets * _SLOTS} slots)')
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        self._mm = mmap.mmap(fd, self._size)
+        self._fd = fd
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._pid = os.getpid()
+
+    def _acquire(self, h):
+        return self._lock_bucket((h >> 32) % self.buckets)
+
+    def _lock_bucket(self, b):
+        mm = self._map()
+        base = _HEADER_SIZE + b * _BUCKET_SIZE
+        lock = self._locks[b % _LOCK_STRIPES]
+        lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _BUCKET_SIZE, base)
+        except BaseException:
+            lock.release()
+            raise
+        return mm, base, lock
+
+    def _release(self, base, lock):
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _BUCKET_SIZE, base)
+        finally:
+            lock.release()
+
+    # --- counters --------------------------------------------------------
+
+    @staticmethod
+    def _rolled(slot, now):
+        """(window, period, current, previous) of a slot as of ``now``."""
+        _, window, period, curr, prev = slot
+        current = int(now // period)
+        if current == window:
+            return window, period, curr, prev
+        if current == window + 1:
+            return current, period, 0, curr
+        return current, period, 0, 0
+
+    @staticmethod
+    def _estimate(window, period, curr, prev, now):
+        weight = 1.0 - (now - window * period) / period
+        return curr + int(prev * weight) if prev else curr
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        """Add ``amount`` hits and return the sliding-window count (``expiry`` = window length)."""
+        now = time.time()
+        period = max(1, int(expiry))
+        h = _key_hash(key)
+        mm, base, lock = self._acquire(h)
+        try:
+            values = _BUCKET.unpack_from(mm, base)
+            hashes = values[0::_FIELDS]
+            if h in hashes:
+                i = hashes.index(h)
+                slot = values[i * _FIELDS:(i + 1) * _FIELDS]
+                if slot[2] == period:
+                    window, _, curr, prev = self._rolled(slot, now)
+                else:
+                    window, curr, prev = int(now // period), 0, 0
+            else:
+                i = self._free_slot(values, now)
+                window, curr, prev = int(now // period), 0, 0
+            curr += amount
+            _SLOT.pack_into(mm, base + i * _SLOT.size, h, window, period, curr, prev)
+        finally:
+            self._release(base, lock)
+        return self._estimate(window, period, curr, prev, now)
+
+    @staticmethod
+    def _free_slot(values, now):
+        """Index of an empty or expired slot, else of the live slot whose window ends first."""
+        victim, victim_end = 0, None
+        for i in range(_SLOTS):
+            h, window, period, _, _ = values[i * _FIELDS:(i + 1) * _FIELDS]
+            if h == 0 or int(now // period) > window + 1:
+                return i
+            end = (window + 1) * period
+            if victim_end is None or end < victim_end:
+                victim, victim_end = i, end
+        return victim
+
+    def _lookup(self, key):
+        h = _key_hash(key)
+        mm, base, lock = self._acquire(h)
+        try:
+            values = _BUCKET.unpack_from(mm, base)
+        finally:
+            self._release(base, lock)
+        hashes = values[0::_FIELDS]
+        if h not in hashes:
+            return None
+        i = hashes.index(h)
+        return values[i * _FIELDS:(i + 1) * _FIELDS]
+
+    def get(self, key):
+        slot = self._lookup(key)
+        if slot is None:
+            return 0
+        now = time.time()
+        window, period, curr, prev = self._rolled(slot, now)
+        return self._estimate(window, period, curr, prev, now)
+
+    def get_expiry(self, key):
+        """End of the key's current window (epoch seconds)."""
+        slot = self._lookup(key)
+        now = time.time()
+        if slot is None:
+            return now
+        period = slot[2]
+        return (int(now // period) + 1) * period
+
+    def clear(self, key):
+        h = _key_hash(key)
+        mm, base, lock = self._acquire(h)
+        try:
+            hashes = _BUCKET.unpack_from(mm, base)[0::_FIELDS]
+            if h in hashes:
+                _SLOT.pack_into(mm, base + hashes.index(h) * _SLOT.size, 0, 0, 0, 0, 0)
+        finally:
+            self._release(base, lock)
+
+    def reset(self):
+        """Drop every counter; returns the number of slots that were in use.
+
+        Buckets are cleared one at a time under the same locks a check takes,
+        so a reset never releases a bucket lock another thread of this process
+        holds (fcntl locks are per process, not per thread).
+        """
+        used = 0
+        empty = bytes(_BUCKET_SIZE)
+        for b in range(self.buckets):
+            mm, base, lock = self._lock_bucket(b)
+            try:
+                used += sum(1 for h in _BUCKET.unpack_from(mm, base)[0::_FIELDS] if h)
+                mm[base:base + _BUCKET_SIZE] = empty
+            finally:
+                self._release(base, lock)
+        return used
+
+    def check(self):
+        try:
+            return self._map() is not None
+        except OSError:
+            return False
+
+
+def default_path():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, 'leads-ratelimit')
+
+
+def from_env():
+    """Flask-Limiter storage URI for RATELIMIT_STORAGE (used when REDIS_URL is not set)."""
+    kind = os.environ.get('RATELIMIT_STORAGE', 'shm').strip().lower()
+    if kind == 'memory' or fcntl is None:
+        return 'memory://'
+    return 'shm://' + os.path.abspath(os.environ.get('RATELIMIT_FILE') or default_path())
@@ -3,48 +3,167 @@
 Backfill access locations by scanning Lead.ip addresses and updating AccessLocation counts.
 Run from project root: python3 scripts/backfill_locations.py
 Requires the same environment as the app (LEADS_DB path or use default data/leads.db).
+
+Leads are read in id-ordered chunks; each chunk's distinct IPs are resolved in
+a bounded thread pool and the per-country counts are added to AccessLocation
+together with the checkpoint (last processed lead id) in one transaction.
+Reruns only scan leads added since the last run; an interrupted run resumes
+where it stopped. --rate and the ip_geo_cache table only apply when lookups go
+to ipapi.co; local GeoIP database lookups run unthrottled.
+
+Without a checkpoint (first run after the upgrade) existing AccessLocation
+rows cannot be told apart from lead counts, so the script refuses to add to
+them and asks for --rebuild.
+
+  python3 scripts/backfill_locations.py                     # incremental
+  python3 scripts/backfill_locations.py --workers 8 --rate 20
+  python3 scripts/backfill_locations.py --rebuild           # wipe AccessLocation and rescan all leads
 """
-import os
 import sys
+import time
 import datetime
+import argparse
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 # Ensure project root is on sys.path so we can import models and app
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
-from models import SessionLocal, Lead, AccessLocation
-from app import get_country_for_ip
+from sqlalchemy import select, func
+from models import init_db, SessionLocal, Lead, AccessLocation, JobCheckpoint
+import geoip
+from geoip import country_for_ip as get_country_for_ip
+from pagestats import upsert_count
+import geocache
+
+CHECKPOINT = 'backfill_locations'
+
+
+class RateLimiter:
+    """Token bucket shared by the resolver threads (``rate`` lookups per second, 0 = unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def load_checkpoint(s):
+    """Last processed lead id, or None when the script has never run."""
+    row = s.get(JobCheckpoint, CHECKPOINT)
+    return row.position if row else None
+
+
+def save_checkpoint(s, position):
+    row = s.get(JobCheckpoint, CHECKPOINT)
+    if row is None:
+        s.add(JobCheckpoint(name=CHECKPOINT, position=position))
+    else:
+        row.position = position
+
+
+def lead_chunks(s, after_id, chunk_size):
+    """Yield lists of (id, ip) with id > after_id, keyset-paginated on the primary key."""
+    while True:
+        rows = s.execute(
+            select(Lead.id, Lead.ip).where(Lead.id > after_id).order_by(Lead.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Incrementally add lead countries to AccessLocation.')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='leads per transaction')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent IP lookups')
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help='max uncached ipapi.co lookups per second (0 = unlimited; local lookups are not limited)')
+    parser.add_argument('--rebuild', action='store_true', help='clear AccessLocation and the checkpoint first')
+    args = parser.parse_args()
+
+    init_db()
+    geoip.prepare()
+    cache = geocache.from_env()
+    remote = geoip.resolves_remotely()
+    limiter = RateLimiter(args.rate if remote else 0)
+    lookups = 0
+    lookups_lock = threading.Lock()
+
+    def resolve_uncached(ip):
+        nonlocal lookups
+        limiter.wait()
+        with lookups_lock:
+            lookups += 1
+        return get_country_for_ip(ip)
+
+    def resolve(ip):
+        return cache.get_or_resolve(ip, resolve_uncached, persist=remote) or 'OTHER'
+
     s = SessionLocal()
     try:
-        print('Scanning leads to rebuild location stats...')
-        counts = {}
-        total = 0
-        for lead in s.query(Lead).all():
-            total += 1
-            ip = (lead.ip or '').strip()
-            if not ip:
-                country = 'OTHER'
-            else:
-                country = get_country_for_ip(ip) or ''
-                if not country:
-                    # Use Accept-Language is not available here; mark as OTHER
-                    country = 'OTHER'
-            counts[country] = counts.get(country, 0) + 1
-        print(f'Processed {total} leads, found {len(counts)} countries')
-
-        # Clear existing access location table
-        print('Clearing existing AccessLocation rows...')
-        s.query(AccessLocation).delete()
-        s.commit()
-
-        now = datetime.datetime.utcnow()
-        for country, cnt in counts.items():
-            al = AccessLocation(country=country, count=cnt, first_seen=now, last_seen=now)
-            s.add(al)
-        s.commit()
-        print('Backfill complete.')
+        if args.rebuild:
+            print('Clearing existing AccessLocation rows and checkpoint...')
+            s.query(AccessLocation).delete()
+            save_checkpoint(s, 0)
+            s.commit()
+        last_id = load_checkpoint(s)
+        if last_id is None:
+            if s.scalar(select(func.count(AccessLocation.id))):
+                print('No checkpoint yet and AccessLocation already has counts (live visits or an older '
+                      'backfill); adding every lead on top would double-count them.\n'
+                      'Run once with --rebuild; later runs are incremental.')
+                return 2
+            last_id = 0
+        remaining = s.scalar(select(func.count(Lead.id)).where(Lead.id > last_id))
+        print(f'Resuming after lead id {last_id}: {remaining} leads to scan')
+        if not remaining:
+            print('Backfill complete (nothing new).')
+            return
+
+        done = unique_total = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            for rows in lead_chunks(s, last_id, args.chunk_size):
+                ips = {(r.ip or '').strip() for r in rows}
+                ips.discard('')
+                ips = sorted(ips)
+                unique_total += len(ips)
+                countries = dict(zip(ips, pool.map(resolve, ips)))
+
+                deltas = {}
+                for r in rows:
+                    country = countries.get((r.ip or '').strip(), 'OTHER')
+                    deltas[country] = deltas.get(country, 0) + 1
+                now = datetime.datetime.utcnow()
+                for country, delta in deltas.items():
+                    s.execute(upsert_count(AccessLocation, 'country', country, delta, now, now))
+                # counts and checkpoint commit together: a crash never double-counts a chunk
+                save_checkpoint(s, rows[-1].id)
+                s.commit()
+
+                done += len(rows)
+                elapsed = time.monotonic() - started
+                rate = done / elapsed if elapsed else 0.0
+                eta = (remaining - done) / rate if rate else 0.0
+                print(f'{done}/{remaining} leads ({done * 100 // remaining}%), last id {rows[-1].id}, '
+                      f'{unique_total} distinct IPs, {lookups} lookups, {rate:.0f} leads/s, ETA {eta:.0f}s',
+                      flush=True)
+        print(f'Backfill complete: {done} leads in {time.monotonic() - started:.1f}s.')
+    except KeyboardInterrupt:
+        s.rollback()
+        print('Interrupted; rerun to continue from the last checkpoint.')
     except Exception as e:
         print('Error during backfill:', e)
         s.rollback()
@@ -53,4 +172,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Bytes on the wire and compression CPU per route: identity vs gzip vs brotli.
+
+Renders each route once through the Flask test client (no server needed), then
+compresses the body with the dynamic settings from compression.py and, for
+static assets, with the precompression settings. Brotli columns are skipped
+when the ``brotli`` package is not installed.
+
+Usage:
+    python scripts/bench_compression.py
+    python scripts/bench_compression.py --routes / /about /deploy --repeat 50
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _time_compress(compression, body, enc, level, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        data = compression.compress(body, enc, level)
+    return len(data), (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    os.environ.setdefault('LEADS_DB', os.path.join(tempfile.gettempdir(), 'bench_compression.db'))
+    os.environ['COMPRESS'] = '0'  # measure raw bodies; compression is timed below
+    sys.path.insert(0, ROOT)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', nargs='+', default=['/', '/about', '/articles', '/deploy'])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    import compression
+    from app import app, asset_manifest
+    dyn = compression.from_env()
+    encodings = [('gzip', dyn.gzip_level, 9)]
+    if compression.brotli is not None:
+        encodings.insert(0, ('br', dyn.brotli_quality, 11))
+
+    bodies = []
+    client = app.test_client()
+    for route in args.routes:
+        resp = client.get(route)
+        bodies.append((route, resp.status_code, resp.get_data(), 'dynamic'))
+    for rel in sorted(asset_manifest.manifest):
+        if rel.endswith(compression.COMPRESSIBLE_EXTENSIONS):
+            with open(os.path.join(asset_manifest.static_dir, rel), 'rb') as f:
+                bodies.append(('/static/' + rel, 200, f.read(), 'static'))
+
+    header = f"{'route':<32} {'status':>6} {'raw':>8}"
+    for enc, _, _ in encodings:
+        header += f" {enc:>8} {enc + ' ms':>8}"
+    print(header)
+    for route, status, body, kind in bodies:
+        line = f'{route:<32} {status:>6} {len(body):>8}'
+        for enc, dyn_level, static_level in encodings:
+            size, ms = _time_compress(compression, body, enc, dyn_level if kind == 'dynamic' else static_level,
+                                      args.repeat)
+            line += f' {size:>8} {ms:>8.2f}'
+        print(line)
+    print('static rows use the one-off precompression level (cost paid once at startup)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Cost per rate-limit check and cross-process accuracy: memory:// vs the shared shm:// storage.
+
+Runs the limits fixed-window strategy (what Flask-Limiter uses by default)
+against each storage, then lets several processes hit one shared limit and
+checks that exactly ``limit`` hits were allowed in total. With memory:// each
+process has its own counters, which is what --workers N did before.
+
+Usage:
+    python scripts/bench_ratelimit.py
+    python scripts/bench_ratelimit.py --checks 500000 --procs 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _storage(uri):
+    import ratelimit
+    from limits.storage import storage_from_string
+    if uri.startswith('shm://'):
+        return ratelimit.SharedMemoryStorage(uri)
+    return storage_from_string(uri)
+
+
+def _allowed(uri, limit, tries, out):
+    from limits import parse
+    from limits.strategies import FixedWindowRateLimiter
+    strategy = FixedWindowRateLimiter(_storage(uri))
+    item = parse(f'{limit}/hour')
+    out.put(sum(strategy.hit(item, '198.51.100.7', 'contact') for _ in range(tries)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--procs', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    from limits import parse
+    from limits.strategies import FixedWindowRateLimiter
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_ratelimit_'), 'counters')
+    uris = ['memory://', f'shm://{path}']
+    item = parse('50/hour')
+    print(f"{'storage':<10} {'us/check':>9} {'allowed':>8} {'expected':>8}")
+    for uri in uris:
+        storage = _storage(uri)
+        strategy = FixedWindowRateLimiter(storage)
+        keys = [f'203.0.113.{i % 250}' for i in range(1000)]
+        t0 = time.perf_counter()
+        for i in range(args.checks):
+            strategy.hit(item, keys[i % 1000], 'home')
+        per_check = (time.perf_counter() - t0) / args.checks * 1e6
+        storage.reset()
+
+        out = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_allowed, args=(uri, args.limit, args.limit * 2, out))
+                 for _ in range(args.procs)]
+        for p in procs:
+            p.start()
+        allowed = sum(out.get() for _ in procs)
+        for p in procs:
+            p.join()
+        print(f'{uri.split(":")[0]:<10} {per_check:>9.2f} {allowed:>8} {args.limit:>8}')
+    print(f'{args.procs} processes x {args.limit * 2} hits against one "{args.limit}/hour" limit')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""Offline latency benchmark of every route, with stubbed ipapi.co, GitHub API and SMTP.
+
+For each dataset size a fresh process seeds a scratch SQLite DB (leads,
+page_views, access_locations, ip_geo_cache) and drives the routes through the
+Flask test client. External services are replaced in-process: the transport of
+the shared httpclient answers ipapi.co and api.github.com from memory, and
+smtplib.SMTP is a no-op session. Nothing leaves the machine.
+
+Every size is measured --repeats times and the median of each number is kept.
+Reports ops/s and p50/p95/p99 per route, writes the results as JSON and fails
+(exit 1) if any route got more than --threshold percent slower against the
+committed baseline (scripts/bench_baseline.json, 1k rows). The comparison is
+relative: the geometric mean of current/baseline over all routes measured in
+both is taken as the speed difference between the two machines (or runs), and
+a route fails when its p50 or p95 is more than --threshold percent above that
+(p95 only when --iterations and --repeats match the baseline's; ops/s, a mean,
+swings with single scheduler hiccups and is reported but not gated). A
+baseline recorded on one machine therefore still holds on a faster or slower
+one; a slowdown shared by every route does not show up (the absolute numbers
+are in the report for that).
+
+With --ci (implied when $CI is set, as in the GitHub workflow) a missing
+baseline, or one that has no numbers for a measured size or route, is an error
+(exit 2) instead of a note.
+
+Usage:
+    python scripts/bench_routes.py                                   # 1k rows, compare with baseline
+    python scripts/bench_routes.py --sizes 1000 100000 1000000 --iterations 300
+    python scripts/bench_routes.py --ci                              # as in CI: no baseline is a failure
+    python scripts/bench_routes.py --save-baseline                   # record a new baseline
+    python scripts/bench_routes.py --routes "GET /" "POST /contact" --stub-latency-ms 50
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+import subprocess
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, 'bench_output.json')
+DEFAULT_BASELINE = os.path.join(ROOT, 'scripts', 'bench_baseline.json')
+
+# "<METHOD> <path>" -> request kwargs factory (i = iteration)
+ROUTES = {
+    'GET /': lambda i: {},
+    'GET /about': lambda i: {},
+    'GET /articles': lambda i: {},
+    'GET /deploy': lambda i: {},
+    'GET /contact': lambda i: {},
+    'POST /contact': lambda i: {'data': {'name': f'Bench {i}', 'email': f'bench{i}@example.com',
+                                         'message': 'Benchmark message ' * 10}},
+    'GET /api/github-actions/status': lambda i: {},
+    'GET /health': lambda i: {},
+    'GET /metrics': lambda i: {},
+    'GET /admin/leads': lambda i: {},
+    'GET /admin/leads?q=kubernetes': lambda i: {},
+    'GET /admin/leads?before=500': lambda i: {},
+    'POST /admin/leads/resend/1': lambda i: {},
+}
+
+WORDS = ('kubernetes', 'docker', 'helm', 'pipeline', 'terraform', 'monitoring', 'ansible', 'prague',
+         'migration', 'cluster', 'budget', 'consulting', 'security', 'backup', 'latency')
+
+
+# ---------------------------------------------------------------- stubs
+
+class StubTransport:
+    """Stands in for the network behind httpclient (ipapi.co, GitHub API)."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {'ipapi': 0, 'github': 0}
+        self.etag = '"bench-etag"'
+        self.runs = json.dumps({'total_count': 5, 'workflow_runs': [{
+            'id': n, 'name': 'Docker publish', 'status': 'completed', 'conclusion': 'success',
+            'created_at': '2026-01-01T00:00:00Z', 'updated_at': '2026-01-01T00:05:00Z',
+            'html_url': f'https://github.com/example/runs/{n}',
+            'head_commit': {'message': f'commit {n}', 'author': {'name': 'Bench'}},
+        } for n in range(5)]}).encode()
+
+    def __call__(self, method, url, headers, connect_timeout, deadline):
+        from httpclient import Response
+        if self.latency:
+            time.sleep(self.latency)
+        if 'ipapi.co' in url:
+            self.calls['ipapi'] += 1
+            return Response(200, {}, random.choice((b'CZ', b'DE', b'US', b'SK', b'GB')))
+        if 'api.github.com' in url:
+            self.calls['github'] += 1
+            if headers.get('If-None-Match') == self.etag:
+                return Response(304, {'ETag': self.etag}, b'')
+            return Response(200, {'ETag': self.etag}, self.runs)
+        return Response(404, {}, b'')
+
+
+class StubSMTP:
+    """No-op smtplib.SMTP replacement."""
+    latency = 0.0
+    sent = 0
+
+    def __init__(self, host=None, port=None, timeout=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def starttls(self, *args, **kwargs):
+        return 220, b'ready'
+
+    def login(self, user, password):
+        return 235, b'ok'
+
+    def noop(self):
+        return 250, b'ok'
+
+    def send_message(self, msg, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        StubSMTP.sent += 1
+        return {}
+
+    def quit(self):
+        return 221, b'bye'
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------- seeding
+
+def seed(models, size):
+    """Fill the scratch DB with ``size`` leads and ``size`` page_views rows (set-based SQL, seconds for 1M)."""
+    random.seed(size)
+    with models.engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TEMP TABLE words(w TEXT)')
+        conn.exec_driver_sql('INSERT INTO words VALUES ' + ','.join(f"('{w}')" for w in WORDS))
+        conn.exec_driver_sql(f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {size})
+            INSERT INTO leads (name, email, message, ip, created_at, emailed, error, attempts)
+            SELECT 'Lead ' || i, 'lead' || i || '@example.com',
+                   'Hello, we need help with ' || (SELECT w FROM words WHERE rowid = i * 7 % {len(WORDS)} + 1)
+                       || ' and ' || (SELECT w FROM words WHERE rowid = i % {len(WORDS)} + 1) || ' ' || hex(randomblob(60)),
+                   '10.' || (i / 65536 % 256) || '.' || (i / 256 % 256) || '.' || (i % 256),
+                   datetime('now', '-' || (i % 730) || ' days'),
+                   i % 5 != 0, CASE WHEN i % 20 = 0 THEN 'SMTP timeout' END, i % 3
+            FROM n""")
+        conn.exec_driver_sql(f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {size})
+            INSERT INTO page_views (path, count, first_seen, last_seen)
+            SELECT CASE WHEN i = 1 THEN '/' ELSE '/p/' || i END, abs(random()) % 10000,
+                   datetime('now', '-800 days'), datetime('now', '-' || (i % 30) || ' days')
+            FROM n""")
+        conn.exec_driver_sql("""
+            INSERT INTO access_locations (country, count, first_seen, last_seen)
+            SELECT w, abs(random()) % 5000, datetime('now'), datetime('now') FROM
+            (SELECT 'CZ' AS w UNION SELECT 'DE' UNION SELECT 'US' UNION SELECT 'SK' UNION SELECT 'OTHER')""")
+        conn.exec_driver_sql(f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {min(size, 100000)})
+            INSERT INTO ip_geo_cache (ip, country, resolved_at)
+            SELECT '10.' || (i / 65536 % 256) || '.' || (i / 256 % 256) || '.' || (i % 256), 'CZ', datetime('now')
+            FROM n""")
+
+
+# ---------------------------------------------------------------- worker
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _worker(size, routes, iterations, warmup, stub_latency, out_q):
+    tmp = tempfile.mkdtemp(prefix='bench_routes_')
+    os.environ.update({
+        'LEADS_DB': os.path.join(tmp, 'leads.db'),
+        'LOG_DIR': os.path.join(tmp, 'log'),
+        'GITHUB_STATUS_CACHE': os.path.join(tmp, 'github_actions_status.json'),
+        'ASSET_ARCHIVE_DIR': '',
+        'OUTBOX_MODE': 'off',
+        'GEOIP_PROVIDER': 'ipapi',
+        'SMTP_HOST': 'smtp.bench.invalid', 'SMTP_USER': 'bench', 'SMTP_PASS': 'bench',
+        'EMAIL_TO': 'owner@example.com',
+        'ADMIN_USER': 'bench', 'ADMIN_PASS': 'bench',
+    })
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    sys.path.insert(0, ROOT)
+
+    import smtplib
+    stub_http = StubTransport(latency=stub_latency)
+    StubSMTP.latency = stub_latency
+    smtplib.SMTP = StubSMTP
+
+    import models
+    models.init_db()
+    t0 = time.perf_counter()
+    seed(models, size)
+    seed_seconds = time.perf_counter() - t0
+
+    import httpclient
+    httpclient.shared().transport = stub_http
+    import app as app_module
+    app = app_module.app
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)  # keep the file handler (real cost), drop console noise
+    app.config['WTF_CSRF_ENABLED'] = False
+    app_module.limiter.enabled = False
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin'] = True
+
+    timings = {name: [] for name in routes}
+    statuses = {name: {} for name in routes}
+    # round-robin over the routes: each one is timed under the same machine conditions,
+    # which the relative comparison against the baseline relies on
+    for i in range(warmup + iterations):
+        # spread visitors over many IPs so the geo cache sees hits and misses
+        headers = {'X-Forwarded-For': f'172.16.{i % 8}.{i % 250 + 1}', 'Accept-Language': 'cs,en;q=0.8'}
+        for name in routes:
+            method, path = name.split(' ', 1)
+            kwargs = ROUTES[name](i)
+            start = time.perf_counter()
+            resp = client.open(path, method=method, headers=headers, **kwargs)
+            resp.get_data()
+            elapsed = time.perf_counter() - start
+            resp.close()
+            if i >= warmup:
+                timings[name].append(elapsed)
+                statuses[name][resp.status_code] = statuses[name].get(resp.status_code, 0) + 1
+
+    results = {}
+    for name in routes:
+        route_timings = sorted(timings[name])
+        total = sum(route_timings)
+        results[name] = {
+            'ops_per_s': round(len(route_timings) / total, 1) if total else 0.0,
+            'p50_ms': round(percentile(route_timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(route_timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(route_timings, 99) * 1000, 3),
+            'statuses': {str(k): v for k, v in sorted(statuses[name].items())},
+        }
+    app_module.page_stats_buffer.flush_quietly()
+    out_q.put({'size': size, 'seed_seconds': round(seed_seconds, 2), 'routes': results,
+               'stub_calls': dict(stub_http.calls, smtp=StubSMTP.sent)})
+
+
+def run_size(size, routes, iterations, warmup, stub_latency):
+    # fresh interpreter per size: app/models bind their DB at import time
+    ctx = mp.get_context('spawn')
+    out_q = ctx.Queue()
+    p = ctx.Process(target=_worker, args=(size, routes, iterations, warmup, stub_latency, out_q))
+    p.start()
+    while True:
+        try:
+            result = out_q.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not p.is_alive():
+                raise SystemExit(f'benchmark worker for {size} rows exited with code {p.exitcode}')
+    p.join()
+    return result
+
+
+def run_repeats(size, routes, iterations, warmup, stub_latency, repeats):
+    """run_size() ``repeats`` times; per route the median of every number, statuses summed."""
+    runs = [run_size(size, routes, iterations, warmup, stub_latency) for _ in range(repeats)]
+    merged = dict(runs[0], repeats=repeats, routes={})
+    for route in runs[0]['routes']:
+        samples = [r['routes'][route] for r in runs]
+        m = {k: statistics.median(s[k] for s in samples) for k in ('ops_per_s', 'p50_ms', 'p95_ms', 'p99_ms')}
+        statuses = {}
+        for s in samples:
+            for code, n in s['statuses'].items():
+                statuses[code] = statuses.get(code, 0) + n
+        m['statuses'] = statuses
+        merged['routes'][route] = m
+    return merged
+
+
+# ---------------------------------------------------------------- reporting
+
+def git_sha():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ''
+
+
+def uncovered(current, baseline):
+    """Measured "<size> rows <route>" entries the baseline has no numbers for."""
+    missing = []
+    for size, run in current['sizes'].items():
+        base_routes = baseline.get('sizes', {}).get(size, {}).get('routes', {})
+        missing.extend(f'{size} rows {route}' for route in run['routes'] if route not in base_routes)
+    return missing
+
+
+def _speed(ratios):
+    """Geometric mean of current/baseline ratios: how much faster or slower this run is overall."""
+    ratios = [r for r in ratios if r > 0]
+    return statistics.geometric_mean(ratios) if len(ratios) >= 3 else 1.0
+
+
+def same_samples(current, baseline):
+    """p95 of a different number of samples is not comparable (the median is)."""
+    keys = ('iterations', 'repeats')
+    return all(current['meta'].get(k) == baseline.get('meta', {}).get(k, 1 if k == 'repeats' else None)
+               for k in keys)
+
+
+def compare(current, baseline, threshold):
+    """Return a list of regression messages: p50 or p95 up by more than threshold % beyond
+    the overall speed difference to the baseline run."""
+    regressions = []
+    factor = 1 + threshold / 100.0
+    check_p95 = same_samples(current, baseline)
+    for size, run in current['sizes'].items():
+        base_run = baseline.get('sizes', {}).get(size)
+        if not base_run:
+            continue
+        common = [(r, base_run['routes'][route], route) for route, r in run['routes'].items()
+                  if route in base_run['routes']]
+        for key in ('p50_ms', 'p95_ms') if check_p95 else ('p50_ms',):
+            speed = _speed([r[key] / b[key] for r, b, _ in common if b[key]])
+            for r, b, route in common:
+                if b[key] and r[key] > b[key] * speed * factor:
+                    regressions.append(f"{size} rows {route}: {key[:3]} {b[key]} -> {r[key]} ms "
+                                       f"(expected ~{b[key] * speed:.3f} on this machine)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000], help='leads / page_views rows to seed')
+    parser.add_argument('--routes', nargs='+', default=list(ROUTES), choices=list(ROUTES), metavar='ROUTE')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=3, help='runs per size; the median is kept')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0, help='simulated latency of stubbed services')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline as well')
+    parser.add_argument('--threshold', type=float, default=20.0, help='allowed regression in percent')
+    parser.add_argument('--ci', action='store_true', default=bool(os.environ.get('CI')),
+                        help='fail when the baseline is missing or does not cover a measured route')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'git_sha': git_sha(), 'python': platform.python_version(), 'platform': platform.platform(),
+                 'iterations': args.iterations, 'repeats': args.repeats,
+                 'stub_latency_ms': args.stub_latency_ms, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'sizes': {},
+    }
+    for size in args.sizes:
+        r = run_repeats(size, args.routes, args.iterations, args.warmup, args.stub_latency_ms / 1000.0,
+                        max(1, args.repeats))
+        report['sizes'][str(size)] = r
+        print(f"\n{size} rows (median of {r['repeats']} runs, seeded in {r['seed_seconds']}s, "
+              f"stub calls {r['stub_calls']})")
+        print(f"{'route':<34} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+        for route, m in r['routes'].items():
+            print(f"{route:<34} {m['ops_per_s']:>9} {m['p50_ms']:>9} {m['p95_ms']:>9} {m['p99_ms']:>9}  {m['statuses']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nresults written to {args.output}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline saved to {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}; run with --save-baseline to create one')
+        if args.ci:
+            sys.exit(2)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    missing = uncovered(report, baseline)
+    if missing:
+        print(f'\nnot in baseline {args.baseline} (re-record it with --save-baseline):')
+        for line in missing:
+            print('  ' + line)
+        if args.ci:
+            sys.exit(2)
+    if not same_samples(report, baseline):
+        print(f"\n--iterations/--repeats differ from the baseline's ({baseline['meta'].get('iterations')}/"
+              f"{baseline['meta'].get('repeats', 1)}): comparing p50 only")
+    regressions = compare(report, baseline, args.threshold)
+    if regressions:
+        print(f'\nREGRESSIONS (> {args.threshold}% vs baseline {baseline["meta"].get("git_sha") or "?"}):')
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1)
+    print(f'no regressions > {args.threshold}% vs baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Concurrent SQLite write benchmark: legacy (rollback journal) vs WAL profile.
+
+Spawns N worker processes (like gunicorn workers) that each commit M small
+transactions against a scratch DB: a Lead insert (contact form) and a page
+view upsert (track_page_view flush). Reports commits/s and "database is locked"
+failures per profile.
+
+Usage:
+    python scripts/bench_sqlite_writes.py                  # 4 workers x 300 commits
+    python scripts/bench_sqlite_writes.py --workers 8 --commits 500 --profiles legacy wal
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _worker(db_path, profile, commits, start_evt, out_q):
+    os.environ['LEADS_DB'] = db_path
+    os.environ['SQLITE_PROFILE'] = profile
+    if profile == 'legacy':
+        # behave like the old engine: pysqlite's default 5s lock wait, no pragmas
+        os.environ['SQLITE_BUSY_TIMEOUT_MS'] = '5000'
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import text
+    import models
+
+    upsert = text('INSERT INTO page_views (path, count, first_seen, last_seen) VALUES (:p, 1, :now, :now) '
+                  'ON CONFLICT(path) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen')
+    ok = locked = 0
+    start_evt.wait()
+    t0 = time.perf_counter()
+    for i in range(commits):
+        s = models.SessionLocal()
+        try:
+            s.add(models.Lead(name=f'bench {i}', email='bench@example.com', message='x' * 200, ip='10.0.0.1'))
+            s.execute(upsert, {'p': '/', 'now': '2026-01-01 00:00:00'})
+            s.commit()
+            ok += 1
+        except Exception as e:
+            s.rollback()
+            if 'locked' in str(e):
+                locked += 1
+            else:
+                raise
+        finally:
+            s.close()
+    out_q.put((ok, locked, time.perf_counter() - t0))
+
+
+def run(profile, workers, commits):
+    ctx = mp.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        from sqlalchemy import create_engine
+        import models  # schema only; workers import their own copy with the profile applied
+        schema_engine = create_engine(f'sqlite:///{db_path}')
+        models.Base.metadata.create_all(bind=schema_engine)
+        schema_engine.dispose()
+
+        start_evt = ctx.Event()
+        out_q = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(db_path, profile, commits, start_evt, out_q)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        time.sleep(1.0)  # let workers import before the gun
+        t0 = time.perf_counter()
+        start_evt.set()
+        results = [out_q.get() for _ in procs]
+        wall = time.perf_counter() - t0
+        for p in procs:
+            p.join()
+    ok = sum(r[0] for r in results)
+    locked = sum(r[1] for r in results)
+    return {'profile': profile, 'workers': workers, 'commits': ok, 'locked': locked,
+            'seconds': round(wall, 3), 'commits_per_s': round(ok / wall, 1) if wall else 0.0}
+
+
+def main():
+    # models only provides the schema here; keep its default engine off the real DB
+    os.environ.setdefault('LEADS_DB', os.path.join(tempfile.gettempdir(), 'bench_sqlite_writes.db'))
+    sys.path.insert(0, ROOT)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--commits', type=int, default=300, help='commits per worker')
+    parser.add_argument('--profiles', nargs='+', default=['legacy', 'wal'])
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'workers':>7} {'commits':>8} {'locked':>7} {'seconds':>8} {'commits/s':>10}")
+    for profile in args.profiles:
+        r = run(profile, args.workers, args.commits)
+        print(f"{r['profile']:<8} {r['workers']:>7} {r['commits']:>8} {r['locked']:>7} {r['seconds']:>8} {r['commits_per_s']:>10}")
+
+
+if __name__ == '__main__':
+    main()
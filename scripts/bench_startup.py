@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Startup cost: cold import -> first response, and gunicorn with and without preload_app.
+
+Part 1 starts --runs fresh interpreters that each import app.py (setup_app()
+runs on import) and serve GET /health through the test client, and reports
+the median import and first-response times plus the slowest imports from
+``python -X importtime``.
+
+Part 2 starts gunicorn (gunicorn.conf.py) with GUNICORN_PRELOAD=0 and =1 and
+reports the time until /health answers, the CPU time the master and workers
+spent getting there, and (Linux) the workers' private and proportional
+memory from /proc/<pid>/smaps_rollup: with preload the workers are forked
+from a master that already imported everything, so most of their pages stay
+shared.
+
+Usage:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --runs 10 --workers 4 --skip-gunicorn
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = r'''
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+status = app.app.test_client().get('/health').status_code
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'first_ms': (t2 - t1) * 1000, 'status': status}))
+'''
+
+
+def _env(workdir, **extra):
+    env = dict(os.environ,
+               PYTHONPATH=ROOT,
+               LEADS_DB=os.path.join(workdir, 'leads.db'),
+               LOG_DIR=workdir,
+               RATELIMIT_FILE=os.path.join(workdir, 'ratelimit'),
+               OUTBOX_MODE='off',
+               **extra)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    return env
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def cold_start(runs, workdir):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, env=_env(workdir),
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def slowest_imports(workdir, top):
+    """(cumulative ms, module) of the slowest imports, nested ones included."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                         env=_env(workdir), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _memory_kb(pid):
+    """(private, pss) in kB from smaps_rollup."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values.get('Private_Clean', 0) + values.get('Private_Dirty', 0), values.get('Pss', 0)
+
+
+def gunicorn_start(preload, workers, workdir):
+    port = _free_port()
+    env = _env(workdir, GUNICORN_PRELOAD='1' if preload else '0', GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}', RATELIMIT_ENABLED='0')
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        while time.perf_counter() - started < 60:
+            if proc.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {proc.returncode}')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+                conn.request('GET', '/health')
+                if conn.getresponse().status == 200:
+                    ready = time.perf_counter() - started
+                    break
+            except OSError:
+                time.sleep(0.01)
+        if ready is None:
+            raise RuntimeError('gunicorn did not become ready')
+        # let every worker finish booting before reading CPU and memory
+        deadline = time.monotonic() + 30
+        while len(_children(proc.pid)) < workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(1.0)
+        pids = _children(proc.pid)
+        cpu = _cpu_seconds(proc.pid) + sum(_cpu_seconds(p) for p in pids)
+        try:
+            memory = [_memory_kb(p) for p in pids]
+        except OSError:
+            memory = []
+        return ready, cpu, memory
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters for the cold start')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        samples = cold_start(args.runs, workdir)
+        print(f'cold start over {args.runs} runs (median): '
+              f"import app {statistics.median(s['import_ms'] for s in samples):.0f} ms, "
+              f"first response {statistics.median(s['first_ms'] for s in samples):.1f} ms")
+        print('\nslowest imports (cumulative):')
+        for ms, name in slowest_imports(workdir, args.top):
+            print(f'  {ms:>8.1f} ms  {name}')
+
+        if args.skip_gunicorn:
+            return
+        print(f"\ngunicorn, {args.workers} workers")
+        print(f"{'preload':<8} {'ready s':>8} {'cpu s':>7} {'private MB/worker':>18} {'pss MB/worker':>14}")
+        for preload in (False, True):
+            ready, cpu, memory = gunicorn_start(preload, args.workers, workdir)
+            if memory:
+                private = statistics.mean(m[0] for m in memory) / 1024
+                pss = statistics.mean(m[1] for m in memory) / 1024
+                mem = f'{private:>18.1f} {pss:>14.1f}'
+            else:
+                mem = f"{'n/a':>18} {'n/a':>14}"
+            print(f"{'on' if preload else 'off':<8} {ready:>8.2f} {cpu:>7.2f} {mem}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
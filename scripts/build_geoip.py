@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Compile an IP-range CSV into the memory-mapped database used by geoip.py.
+
+Usage:
+    python scripts/build_geoip.py dbip-country-lite.csv            # writes data/geoip.bin
+    python scripts/build_geoip.py ranges.csv --out /app/data/geoip.bin
+    python scripts/build_geoip.py --lookup 8.8.8.8 1.1.1.1          # query the compiled DB
+
+Accepts DB-IP lite style rows (1.0.0.0,1.0.0.255,AU) or IP2Location LITE integer rows.
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import geoip
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the offline GeoIP database.')
+    parser.add_argument('csv', nargs='?', help='CSV range file to compile')
+    parser.add_argument('--out', default=os.environ.get('GEOIP_DB') or geoip.DEFAULT_DB_PATH,
+                        help='output path (default GEOIP_DB or data/geoip.bin)')
+    parser.add_argument('--lookup', nargs='+', metavar='IP', help='look up IPs in the compiled DB')
+    args = parser.parse_args()
+
+    if args.csv:
+        t0 = time.perf_counter()
+        n4, n6 = geoip.compile_csv(args.csv, args.out)
+        print(f'Compiled {n4} IPv4 and {n6} IPv6 ranges into {args.out} in {time.perf_counter() - t0:.2f}s')
+
+    if args.lookup:
+        db = geoip.GeoIPDatabase(args.out)
+        for ip in args.lookup:
+            t0 = time.perf_counter()
+            cc = db.lookup(ip)
+            print(f'{ip}\t{cc or "-"}\t{(time.perf_counter() - t0) * 1e6:.1f}us')
+
+    if not args.csv and not args.lookup:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,59 +5,72 @@ Usage:
   ./scripts/clear_leads.py         # interactive, asks for confirmation
   ./scripts/clear_leads.py --yes   # runs non-interactively
 
-The script will first create a timestamped backup copy of the SQLite file (data/leads.db)
-into the same directory named leads.db.YYYYmmdd_HHMMSS.bak.
-
-It uses the project's SQLAlchemy SessionLocal and Lead model.
+The script first writes an online backup of the SQLite DB to data/backups
+(sqlite3 backup API, does not block the running app), then deletes leads in
+small batches so web workers are never locked out for long, archiving the
+rows to data/archive/leads.<timestamp>.ndjson.gz. See maintenance.py.
 """
 import os
-import shutil
-import datetime
-import argparse
 import sys
+import argparse
+import datetime
+import logging
 
 # Ensure we can import models from project root
-HERE = os.path.dirname(os.path.dirname(__file__))
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if HERE not in sys.path:
     sys.path.insert(0, HERE)
 
 try:
-    from models import SessionLocal, Lead, AccessLocation
+    from models import SessionLocal, AccessLocation, JobCheckpoint, DB_PATH
+    import maintenance
 except Exception as e:
     print("Failed to import models. Run this script from the project root and ensure dependencies are installed.")
     raise
 
-DB_FILE = os.path.join(HERE, 'data', 'leads.db')
-
 parser = argparse.ArgumentParser(description='Clear all leads from the SQLite DB (with backup).')
 parser.add_argument('--yes', action='store_true', help='Do not ask for confirmation')
+parser.add_argument('--no-backup', action='store_true', help='Skip the backup copy')
+parser.add_argument('--no-archive', action='store_true', help='Do not archive deleted leads')
 args = parser.parse_args()
 
-if not os.path.exists(DB_FILE):
-    print(f"DB file not found: {DB_FILE}")
+if not os.path.exists(DB_PATH):
+    print(f"DB file not found: {DB_PATH}")
     sys.exit(1)
 
-# Backup creation disabled per request — script will NOT create a backup copy of the DB.
-# If you need backups in the future, re-enable the code below or run an external backup.
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
 if not args.yes:
     confirm = input('This will DELETE ALL rows from the leads table. Type YES to proceed: ')
     if confirm.strip() != 'YES':
-        print('Aborted by user. Backup preserved.')
+        print('Aborted by user.')
         sys.exit(0)
 
-# Perform deletion using SQLAlchemy
+if not args.no_backup:
+    print(f'Backup created: {maintenance.backup()}')
+
+try:
+    # everything created up to now, in batches
+    deleted_leads, archive_path = maintenance.purge_leads(before=datetime.datetime.utcnow() + datetime.timedelta(seconds=1),
+                                                          archive=not args.no_archive)
+    print(f'Deleted {deleted_leads} rows from leads table.' + (f' Archived to {archive_path}.' if archive_path else ''))
+except Exception as e:
+    print('Failed to clear leads:', e)
+    sys.exit(1)
+
+# access_locations is one row per country: a single short delete is fine.
+# Lead ids start again from 1 after the wipe, so the backfill checkpoint (last lead id
+# counted) goes in the same transaction; otherwise the next backfill skips the new leads.
 session = SessionLocal()
 try:
-    deleted_leads = session.query(Lead).delete()
     deleted_locs = session.query(AccessLocation).delete()
+    session.query(JobCheckpoint).filter(JobCheckpoint.name == 'backfill_locations').delete()
     session.commit()
-    print(f'Deleted {deleted_leads} rows from leads table.')
-    print(f'Deleted {deleted_locs} rows from access locations table.')
+    print(f'Deleted {deleted_locs} rows from access locations table (backfill checkpoint reset).')
 except Exception as e:
     session.rollback()
-    print('Failed to clear leads:', e)
+    print('Failed to clear access locations:', e)
 finally:
     session.close()
 
-print('Done. No backup was created (backups disabled).')
+print('Done.')
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Export leads / page views / access locations as CSV or NDJSON without copying the DB.
+
+Streams rows in batches (constant memory) to stdout or a file:
+    python scripts/export_data.py leads --format csv --output leads.csv
+    python scripts/export_data.py leads --state failed --since 2026-01-01 --until 2026-01-31
+    python scripts/export_data.py page_views --gzip --output page_views.ndjson.gz
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models import SessionLocal
+import export
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a table as CSV/NDJSON.')
+    parser.add_argument('table', choices=sorted(export.TABLES))
+    parser.add_argument('--format', choices=sorted(export.FORMATS), default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--since', help='ISO date/datetime (inclusive)')
+    parser.add_argument('--until', help='ISO date (inclusive) or datetime (exclusive)')
+    parser.add_argument('--state', choices=export.STATES, help='leads only')
+    parser.add_argument('--output', '-o', help='file to write (default: stdout)')
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        try:
+            chunks = export.stream(session, args.table, fmt=args.format, gzip=args.gzip,
+                                   since=args.since, until=args.until, state=args.state)
+        except ValueError as e:
+            parser.error(str(e))
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+            else:
+                out.flush()
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
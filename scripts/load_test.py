@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Concurrency under slow upstreams: sync vs gthread gunicorn workers.
+
+Starts a stub ipapi service that answers after --upstream-delay, then for each
+worker profile runs gunicorn (gunicorn.conf.py, GEOIP_PROVIDER=ipapi pointed
+at the stub) and fires --requests GETs of / with --concurrency clients. Every
+request carries a new X-Forwarded-For address, so each one misses the geo cache
+and waits on the upstream.
+
+Usage:
+    python scripts/load_test.py
+    python scripts/load_test.py --profiles sync gthread --concurrency 200 --upstream-delay 0.5
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_upstream(delay):
+    """ipapi.co stand-in: GET /<ip>/country/ -> "CZ" after ``delay`` seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = b'CZ'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(('127.0.0.1', _free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_gunicorn(profile, port, upstream_url, workdir, workers):
+    env = dict(os.environ,
+               GUNICORN_WORKER_CLASS=profile,
+               GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}',
+               GEOIP_PROVIDER='ipapi',
+               GEOIP_IPAPI_URL=upstream_url,
+               RATELIMIT_ENABLED='0',
+               LEADS_DB=os.path.join(workdir, 'leads.db'),
+               LOG_DIR=workdir,
+               OUTBOX_MODE='off')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn ({profile}) exited with {proc.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'gunicorn ({profile}) did not become ready')
+
+
+def run_load(port, total, concurrency):
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def client():
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            ip = f'203.0.{n // 250 % 250}.{n % 250 + 1}'
+            started = time.perf_counter()
+            # a new connection per request: sync workers do not keep connections alive
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            try:
+                conn.request('GET', '/', headers={'X-Forwarded-For': ip})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+            except OSError:
+                ok = False
+            finally:
+                conn.close()
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return time.perf_counter() - started, sorted(latencies), errors[0]
+
+
+def _pct(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['sync', 'gthread'], choices=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--upstream-delay', type=float, default=0.2, help='seconds per upstream call')
+    args = parser.parse_args()
+
+    upstream = start_upstream(args.upstream_delay)
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}'
+    print(f'{args.requests} requests, {args.concurrency} clients, {args.workers} workers, '
+          f'upstream {args.upstream_delay * 1000:.0f} ms')
+    print(f"{'profile':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>6}")
+    for profile in args.profiles:
+        workdir = tempfile.mkdtemp(prefix=f'load_{profile}_')
+        port = _free_port()
+        proc = start_gunicorn(profile, port, upstream_url, workdir, args.workers)
+        try:
+            elapsed, lat, errors = run_load(port, args.requests, args.concurrency)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f'{profile:<8} {len(lat) / elapsed:>8.1f} {_pct(lat, 0.5):>8.0f} {_pct(lat, 0.95):>8.0f} '
+              f'{_pct(lat, 1.0):>8.0f} {errors:>6}')
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
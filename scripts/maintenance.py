@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Leads DB maintenance: hot backup, retention purge (archived), incremental vacuum.
+
+Safe to run while the app is serving (see maintenance.py):
+    python scripts/maintenance.py backup
+    python scripts/maintenance.py purge --days 365            # or LEAD_RETENTION_DAYS
+    python scripts/maintenance.py vacuum
+    python scripts/maintenance.py vacuum --enable             # one-off, full VACUUM (blocks writers)
+    python scripts/maintenance.py all                        # backup + purge + vacuum, e.g. nightly cron
+    python scripts/maintenance.py stats
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models import init_db
+import maintenance
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Leads DB maintenance jobs.')
+    parser.add_argument('job', choices=['backup', 'purge', 'vacuum', 'all', 'stats'])
+    parser.add_argument('--days', type=int, help='purge leads older than this (default LEAD_RETENTION_DAYS)')
+    parser.add_argument('--no-archive', action='store_true', help='purge without writing the NDJSON archive')
+    parser.add_argument('--enable', action='store_true', help='vacuum: switch the DB to auto_vacuum=INCREMENTAL first')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    init_db()
+
+    if args.job in ('backup', 'all'):
+        maintenance.backup()
+    if args.job in ('purge', 'all'):
+        deleted, path = maintenance.purge_leads(older_than_days=args.days, archive=not args.no_archive)
+        print(f'purged {deleted} leads' + (f' -> {path}' if path else ''))
+    if args.job in ('vacuum', 'all'):
+        if args.enable and maintenance.auto_vacuum_mode() != 'incremental':
+            print(f'auto_vacuum: {maintenance.enable_incremental_vacuum()}')
+        print(f'released {maintenance.incremental_vacuum()} pages')
+    if args.job == 'stats':
+        print(json.dumps(maintenance.db_stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Standalone contact-email outbox worker.
+
+Run this as a separate process/container when the web workers should not send
+mail themselves (set OUTBOX_MODE=off for the web app):
+    python scripts/outbox_worker.py            # run forever
+    python scripts/outbox_worker.py --once     # drain due leads and exit (cron)
+Uses the same SMTP_* / OUTBOX_* environment as the app.
+"""
+import os
+import sys
+import signal
+import logging
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models import init_db
+import mailer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deliver queued contact emails.')
+    parser.add_argument('--once', action='store_true', help='drain due leads and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    init_db()
+    worker = mailer.from_env()
+    if not mailer.smtp_settings():
+        print('Missing one of SMTP_HOST/SMTP_USER/SMTP_PASS/EMAIL_TO in env')
+        return 2
+
+    if args.once:
+        total = 0
+        while True:
+            n = worker.process_batch()
+            if not n:
+                break
+            total += n
+        print(f'Handled {total} leads (sent={worker.sent} failed={worker.failed})')
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
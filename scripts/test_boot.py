@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Boot test: start gunicorn the way the Docker image does and check it serves.
+
+Runs gunicorn.conf.py with preload_app on and Prometheus multi-process mode on,
+with PROMETHEUS_MULTIPROC_DIR pointing at a directory that does not exist yet
+(as /tmp/prometheus in a fresh container), then checks that /health answers
+200 and that /metrics aggregates the workers' samples. Exits 0 when it boots,
+1 otherwise (gunicorn's output is printed on failure).
+
+Usage:
+    python scripts/test_boot.py
+    python scripts/test_boot.py --no-preload --workers 4
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', path)
+        resp = conn.getresponse()
+        return resp.status, resp.read().decode('utf-8', errors='replace')
+    finally:
+        conn.close()
+
+
+def boot(preload, workers, workdir, timeout):
+    """Start gunicorn, return (ok, message)."""
+    port = _free_port()
+    metrics_dir = os.path.join(workdir, 'prometheus')  # deliberately not created
+    env = dict(os.environ,
+               GUNICORN_PRELOAD='1' if preload else '0',
+               GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}',
+               PROMETHEUS_MULTIPROC_DIR=metrics_dir,
+               LEADS_DB=os.path.join(workdir, 'leads.db'),
+               LOG_DIR=workdir,
+               RATELIMIT_FILE=os.path.join(workdir, 'ratelimit'),
+               OUTBOX_MODE='off',
+               GEOIP_PROVIDER='off')
+    env.pop('METRICS_TOKEN', None)
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                                cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if proc.poll() is not None:
+                return False, f'gunicorn exited with {proc.returncode}'
+            if time.monotonic() > deadline:
+                return False, f'/health did not answer within {timeout}s'
+            try:
+                status, _ = _get(port, '/health')
+                if status == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        for _ in range(10):
+            _get(port, '/health')
+        status, body = _get(port, '/metrics')
+        if status != 200:
+            return False, f'/metrics answered {status}'
+        if 'http_request_duration_seconds' not in body:
+            return False, '/metrics has no request samples'
+        return True, f'/health and /metrics OK, {len(os.listdir(metrics_dir))} metric files'
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--no-preload', action='store_true', help='boot with GUNICORN_PRELOAD=0')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for /health')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='test_boot_')
+    try:
+        preload = not args.no_preload
+        ok, message = boot(preload, args.workers, workdir, args.timeout)
+        print(f"preload {'on' if preload else 'off'}, {args.workers} workers: {message}")
+        if not ok:
+            with open(os.path.join(workdir, 'gunicorn.log')) as f:
+                print(f.read()[-4000:])
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
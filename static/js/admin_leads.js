@@ -0,0 +1,16 @@
+// admin_leads.js: fetch a lead's message body on first expand (the list is rendered without it)
+(function () {
+    document.addEventListener('toggle', function (event) {
+        const details = event.target;
+        if (!details.open || !details.dataset || !details.dataset.messageUrl || details.dataset.loaded) return;
+        details.dataset.loaded = '1';
+        const out = details.querySelector('.lead-message');
+        fetch(details.dataset.messageUrl, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+            .then(function (r) { return r.ok ? r.json() : Promise.reject(r.status); })
+            .then(function (data) { out.textContent = data.message; })
+            .catch(function () {
+                delete details.dataset.loaded;
+                out.textContent = '—';
+            });
+    }, true);
+})();
@@ -53,7 +53,7 @@
                 throw new Error(data.error || 'Failed to fetch');
             }
 
-            renderActions(data.runs);
+            applySnapshot(data.runs);
         } catch (error) {
             console.error('Error fetching GitHub Actions:', error);
             document.getElementById('github-actions-container').innerHTML = `
@@ -102,20 +102,69 @@
         `).join('');
     }
 
-    // Initial fetch
-    fetchGitHubActions();
+    // Live updates: one EventSource (snapshot + diffs) with fallback to polling
+    let runsById = new Map();
+    let source = null;
+
+    function currentRuns() {
+        return Array.from(runsById.values())
+            .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
+            .slice(0, 5);
+    }
+
+    function applySnapshot(runs) {
+        runsById = new Map((runs || []).map(run => [run.id, run]));
+        renderActions(currentRuns());
+    }
+
+    function applyDiff(diff) {
+        (diff.removed || []).forEach(id => runsById.delete(id));
+        (diff.added || []).concat(diff.changed || []).forEach(run => runsById.set(run.id, run));
+        renderActions(currentRuns());
+    }
+
+    function startPolling() {
+        if (refreshInterval) return;
+        fetchGitHubActions();
+        refreshInterval = setInterval(() => {
+            // don't poll while the tab is hidden
+            if (!document.hidden) fetchGitHubActions();
+        }, 30000);
+    }
+
+    function startStream() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+        source = new EventSource('/api/github-actions/stream');
+        source.addEventListener('snapshot', e => applySnapshot(JSON.parse(e.data).runs));
+        source.addEventListener('diff', e => applyDiff(JSON.parse(e.data)));
+        source.onerror = () => {
+            // CLOSED = server refused the stream (e.g. 503 on sync workers); EventSource won't retry
+            if (source.readyState === EventSource.CLOSED) {
+                source = null;
+                startPolling();
+            }
+        };
+    }
+
+    startStream();
 
     // Refresh button
     document.getElementById('refresh-actions').addEventListener('click', () => {
         fetchGitHubActions();
     });
 
-    // Auto-refresh every 30 seconds
-    refreshInterval = setInterval(fetchGitHubActions, 30000);
+    // catch up immediately when a hidden tab becomes visible again
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden && refreshInterval) fetchGitHubActions();
+    });
 
     // Cleanup on page unload
     window.addEventListener('beforeunload', () => {
         clearInterval(refreshInterval);
+        if (source) source.close();
     });
 })();
 
@@ -239,3 +288,56 @@
     // expose for debugging
     window.__deploy_tl = tl;
 })();
+
+// Live log follow: EventSource on /api/logs/stream resuming from a byte-offset cursor
+(function () {
+    const output = document.getElementById('log-output');
+    const follow = document.getElementById('log-follow');
+    const level = document.getElementById('log-level');
+    if (!output || !follow || !window.EventSource) return;
+
+    const MAX_LINES = 1000;
+    let cursor = output.dataset.cursor || '';
+    let source = null;
+
+    function appendLines(lines) {
+        const atBottom = output.scrollTop + output.clientHeight >= output.scrollHeight - 20;
+        const all = (output.textContent ? output.textContent + '\n' : '') + lines.join('\n');
+        const kept = all.split('\n');
+        output.textContent = kept.slice(-MAX_LINES).join('\n');
+        if (atBottom) output.scrollTop = output.scrollHeight;
+    }
+
+    function stop() {
+        if (source) source.close();
+        source = null;
+    }
+
+    function start() {
+        stop();
+        const params = new URLSearchParams();
+        if (cursor) params.set('cursor', cursor);
+        if (level.value) params.set('level', level.value);
+        source = new EventSource('/api/logs/stream?' + params.toString());
+        source.addEventListener('lines', e => {
+            cursor = e.lastEventId || cursor;
+            appendLines(JSON.parse(e.data));
+        });
+        source.addEventListener('end', e => {
+            const info = JSON.parse(e.data);
+            if (info.cursor) cursor = info.cursor;
+        });
+        source.onmessage = e => { cursor = e.lastEventId || cursor; };
+        source.onerror = () => {
+            if (source && source.readyState === EventSource.CLOSED) {
+                // refused (e.g. sync workers or too many followers)
+                stop();
+                follow.checked = false;
+            }
+        };
+    }
+
+    follow.addEventListener('change', () => (follow.checked ? start() : stop()));
+    level.addEventListener('change', () => { if (follow.checked) start(); });
+    window.addEventListener('beforeunload', stop);
+})();